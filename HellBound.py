@@ -2,24 +2,275 @@
 
     Date:
     
-    Description: This game is a 1v1 duel arena, for 2 players. Players will use 
-                 two different keyboard layouts on the keyboard. Player 1 will
-                 use WASD keys for movement, and letters G,H,J for commands. 
-                 Player 2 will use the arrow keys for movement and comma,period,
-                 slash for commands. The winner will be the player who kills 
-                 their opponent first. Players can attack, block, and jump 
-                 around on platforms.
+    Description: This game is a duel arena for 2 players, or a free-for-all
+                 of up to 8 when run with --players N. Players share the
+                 keyboard, each with their own layout. Player 1 will use WASD
+                 keys for movement, and letters G,H,J for commands. Player 2
+                 will use the arrow keys for movement and comma,period,slash
+                 for commands. Players 3 and 4 use the numpad, and K,L,;,O
+                 with P,[,]. The help screen lists every layout, and bots
+                 play any players past the 4th. In a free-for-all, each
+                 player has their number above them, in the colour of their
+                 healthbar. Online play, with --peer, is always a duel. The
+                 winner will be the last player standing. Players can
+                 attack, block, and jump around on platforms.
 """
 
 # I - IMPORT AND INITIALIZE
-import pygame, HellBoundSprites
-pygame.init()
-pygame.mixer.init()
-screen = pygame.display.set_mode((920, 520)) 
+import os, sys, random, functools, pygame, HellBoundSprites, HellBoundLevel, HellBoundAssets, HellBoundRender, HellBoundSim, HellBoundReplay, HellBoundProfile, HellBoundNet, HellBoundAudio, HellBoundHUD, HellBoundBots
+
+# The window, opened by main()
+screen = None
 
 # Global variable of what the game is doing
 STATE = "intro"
 
+# Options, set from the command line by configure()
+
+# Frames per second every scene is drawn at, 0 draws as fast as possible.
+# Set by running with --fps N. Matches are simulated at HellBoundSim.RATE
+# whatever this is, so a faster display only makes motion smoother.
+FPS = 60
+
+# Draws moving sprites between simulation steps when True, turned off by running with --no-interpolate
+INTERPOLATE = True
+
+# Longest time in seconds a match catches up on after a stall, so a long
+# pause skips ahead instead of freezing the window while it simulates
+CATCH_UP = 0.25
+
+# Level the match is played on, set by running with --level FILE
+LEVEL = "level.txt"
+
+# Only pushes the changed parts of the screen when True, set by running with --dirty
+DIRTY = False
+
+# Replay file each match is recorded to, set by running with --record FILE
+RECORD = None
+
+# Replay file to watch instead of playing, set by running with --replay FILE.
+# With --fast, the replay runs as fast as possible instead of at 60 frames per second.
+REPLAY = None
+FAST = False
+
+# Peer to play online against, set by running with --peer HOST:PORT. --port PORT
+# sets the UDP port this window listens on, and --side 1 or 2 the player it
+# controls, with either keyboard layout. --delay MS and --loss FRACTION make
+# every packet sent late or lost, to try out a bad network on one machine.
+PEER = None
+PORT = 7000
+SIDE = 1
+DELAY = 0.0
+LOSS = 0.0
+
+# Profiles every frame from the start when True, set by running with --profile.
+# F3 turns the profiler and its overlay on and off during a match.
+PROFILE = False
+
+# Chrome trace file the profiler's timings are saved to on exit, set by running with --trace FILE
+TRACE = None
+
+# Lets each player keep dozens of fireballs in play when True, set by running
+# with --barrage, and makes enemy fireballs destroy each other, set by running
+# with --clash. A replay is watched with the rules it was recorded with, and
+# online peers leave a match played with different ones.
+BARRAGE = False
+CLASHES = False
+
+# Players in each match, 2 for a duel or up to 8 for a free-for-all, set by
+# running with --players N. The first 4 share the keyboard, with the layouts
+# in HellBoundSim.KEYMAPS, and bots play the others. Online matches are duels.
+PLAYERS = 2
+
+# Bots playing the players without a key layout, in turn
+BOTS = ("rusher","zoner","turtle")
+
+# Actions listed on the help screen for each key layout, by input bit
+ACTIONS = ((HellBoundSim.JUMP,"Jump"),(HellBoundSim.LEFT,"Left"),(HellBoundSim.CROUCH,"Crouch"),
+           (HellBoundSim.RIGHT,"Right"),(HellBoundSim.ATTACK,"Sword Attack"),
+           (HellBoundSim.FIREBALL,"Fireball"),(HellBoundSim.DEFEND,"Defend"))
+
+# Names the help screen gives keys whose symbols the font does not have
+KEY_NAMES = {",": "comma", ".": "period", "/": "slash", ";": "semicolon", "[": "l bracket", "]": "r bracket"}
+
+def option(arguments,name):
+    '''Returns the value given after a command line flag, or None'''
+    if name in arguments and arguments.index(name) + 1 < len(arguments):
+        return arguments[arguments.index(name) + 1]
+    return None
+
+def configure(arguments):
+    '''Sets the options from a list of command line arguments, eg. ["--level","arena.txt","--dirty"]'''
+    global FPS, INTERPOLATE, LEVEL, DIRTY, RECORD, REPLAY, FAST, PEER, PORT, SIDE, DELAY, LOSS, PROFILE, TRACE, BARRAGE, CLASHES, PLAYERS
+    FPS = int(option(arguments,"--fps") or 60)
+    INTERPOLATE = "--no-interpolate" not in arguments
+    LEVEL = option(arguments,"--level") or "level.txt"
+    DIRTY = "--dirty" in arguments
+    RECORD = option(arguments,"--record")
+    REPLAY = option(arguments,"--replay")
+    FAST = "--fast" in arguments
+    PEER = option(arguments,"--peer")
+    PORT = int(option(arguments,"--port") or 7000)
+    SIDE = int(option(arguments,"--side") or 1)
+    DELAY = float(option(arguments,"--delay") or 0) / 1000
+    LOSS = float(option(arguments,"--loss") or 0)
+    PROFILE = "--profile" in arguments
+    TRACE = option(arguments,"--trace")
+    BARRAGE = "--barrage" in arguments
+    CLASHES = "--clash" in arguments
+    PLAYERS = int(option(arguments,"--players") or 2)
+    
+    # Stops with a message for options that cannot be played, rather than
+    # once the match starts
+    if not 2 <= PLAYERS <= HellBoundSim.MAX_PLAYERS:
+        sys.exit("--players must be from 2 to " + str(HellBoundSim.MAX_PLAYERS) + ", not " + str(PLAYERS))
+    if PEER and PLAYERS != 2:
+        sys.exit("--peer plays a duel online, it cannot be used with --players " + str(PLAYERS))
+    if SIDE not in (1,2):
+        sys.exit("--side must be 1 or 2, not " + str(SIDE))
+
+# Sprite classes whose update methods are timed by the profiler
+PROFILED = (HellBoundSprites.Player,HellBoundSprites.Projectile,HellBoundSprites.HealthBar,HellBoundHUD.Widget)
+
+# The level drawn onto the background, kept between matches
+levelLayer = HellBoundRender.StaticLayer()
+
+# Loads every asset behind a loading screen before the first scene when True
+PRELOAD = True
+
+# Sizes of the font used by the labels
+FONT = "rez/ARCADECLASSIC.TTF"
+FONT_SIZES = (16,20,30,40,60,75)
+
+# Sound effects, with the channels each may use and the milliseconds a retrigger
+# is merged into the voice already playing. Holding defend asks for the block
+# sound every other frame, and a sword swing asks for the cut sound 5 times.
+EFFECTS = {"block": HellBoundAudio.Effect("music/fx/block.wav",0.5,2,250),
+           "cut": HellBoundAudio.Effect("music/fx/cut.wav",0.5,2,150),
+           "fireball": HellBoundAudio.Effect("music/fx/fireball.wav",0.5,2,0)}
+
+# Background music
+MUSIC = ("music/background/intro.mp3","music/background/game.mp3")
+
+class Scenes(object):
+    '''This class runs the scene of the current STATE, and keeps what each
+    scene builds between visits, so going back to a scene is instant'''
+    def __init__(self):
+        '''The initializer starts with no scenes and nothing kept'''
+        self.__scenes = {}    # STATE -> function that runs the scene
+        self.__resident = {}  # Name -> resource built by a scene
+        self.__music = None   # Path of the music playing
+
+    def add(self,state,scene):
+        '''Sets the function that runs while STATE is state'''
+        self.__scenes[state] = scene
+
+    def keep(self,name,build):
+        '''Returns a resource, calling build() to make it on the first visit'''
+        if name not in self.__resident:
+            self.__resident[name] = build()
+        return self.__resident[name]
+
+    def music(self,path):
+        '''Plays a background track on repeat from memory, unless it is already playing'''
+        if path == self.__music and pygame.mixer.music.get_busy():
+            return
+        HellBoundAssets.startMixer()
+        pygame.mixer.music.load(HellBoundAssets.music(path),os.path.splitext(path)[1][1:])
+        pygame.mixer.music.set_volume(0.3)
+        pygame.mixer.music.play(-1)
+        self.__music = path
+
+    def run(self):
+        '''Runs scenes until STATE is "quit"'''
+        while STATE != "quit":
+            self.__scenes[STATE]()
+
+    def clear(self):
+        '''Drops everything kept, eg. before pygame is shut down'''
+        self.__resident = {}
+        self.__music = None
+
+# The scenes of the game, filled in below
+scenes = Scenes()
+
+def preloadJobs():
+    '''Returns the jobs that load every asset the scenes use. The level is
+    made by loading() once they are done.'''
+    cache = HellBoundAssets.cache
+    jobs = [functools.partial(cache.image,"rez/background.png",False,False,False),
+            functools.partial(cache.image,"rez/pointer.gif",False,True,False),
+            functools.partial(cache.image,"rez/surface.png",False,True,False)]
+    for num in ("1","2"):
+        if os.path.isfile("rez/atlas/player" + num + ".png"):
+            jobs.append(functools.partial(cache.image,"rez/atlas/player" + num + ".png",False,True,False))
+    for size in FONT_SIZES:
+        jobs.append(functools.partial(cache.font,FONT,size))
+    for name in EFFECTS:
+        jobs.append(functools.partial(cache.sound,EFFECTS[name].path))
+    for path in MUSIC:
+        jobs.append(functools.partial(cache.music,path))
+    return jobs
+
+def loading(preloader):
+    '''This function shows an animated loading screen while the preloader runs'''
+    global STATE
+    
+    # D - DISPLAY
+    pygame.display.set_caption("Loading")
+    
+    # E - ENTITIES
+    # The title's font is opened before the worker thread starts, as both
+    # threads opening fonts at once is not safe
+    background = pygame.Surface(screen.get_size()).convert()
+    background.fill((0,0,0))
+    title = HellBoundSprites.Label(460,200,40,"loading","center")
+    bar = pygame.Rect(260,280,400,10)
+    
+    # ASSIGN
+    clock = pygame.time.Clock()
+    count = 0
+    
+    # The sounds are decoded on the worker thread, for the mixer started here
+    HellBoundAssets.startMixer()
+    preloader.start()
+    
+    # LOOP
+    while not preloader.finished():
+        
+        # TIME
+        clock.tick(FPS)
+        
+        # EVENT HANDLING
+        for event in pygame.event.get():
+            # Quits the game, the worker thread stops with it
+            if event.type == pygame.QUIT:
+                STATE = "quit"
+                return
+                
+        # REFRESH SCREEN
+        # The bar fills as assets load, while a block sweeps along it
+        screen.blit(background,(0,0))
+        screen.blit(title.image,title.rect)
+        pygame.draw.rect(screen,(80,0,0),bar)
+        filled = pygame.Rect(bar.left,bar.top,int(bar.width * preloader.progress()),bar.height)
+        pygame.draw.rect(screen,(255,0,0),filled)
+        sweep = pygame.Rect(bar.left + (count * 8) % bar.width,bar.top,20,bar.height).clip(bar)
+        pygame.draw.rect(screen,(255,200,0),sweep)
+        pygame.display.flip()
+        count += 1
+    
+    # The level is made once the worker is done, on the main thread, as its
+    # platforms are converted to the display format
+    scenes.keep(("level",LEVEL),lambda: HellBoundLevel.Level(LEVEL))
+
+def introSprites():
+    '''Returns the sprites of the intro screen'''
+    return (HellBoundSprites.Label(460,50,75,"-+=Hellbound=+-","center"),
+            HellBoundSprites.Label(460,350,40,"play","center"),
+            HellBoundSprites.Label(460,400,40,"instructions","center"),
+            HellBoundSprites.Point())
+
 def intro():
     '''This function displays the intro screen'''
     # Any reference to STATE refers to the global variable
@@ -29,19 +280,14 @@ def intro():
     pygame.display.set_caption("Welcome!")
     
     # E - ENTITIES
-    background = pygame.image.load("rez/background.png")
+    background = HellBoundAssets.image("rez/background.png",alpha=False)
     screen.blit(background, (0,0))
     
     # Background Music
-    pygame.mixer.music.load("music/background/intro.mp3")
-    pygame.mixer.music.set_volume(0.3)
-    pygame.mixer.music.play(-1)
-    
-    # Sprites
-    title = HellBoundSprites.Label(460,50,75,"-+=Hellbound=+-","center")
-    play = HellBoundSprites.Label(460,350,40,"play","center")
-    instructions = HellBoundSprites.Label(460,400,40,"instructions","center")
-    pointer = HellBoundSprites.Point()
+    scenes.music("music/background/intro.mp3")
+    
+    # Sprites, built on the first visit
+    title, play, instructions, pointer = scenes.keep("intro",introSprites)
     
     allSprites = pygame.sprite.OrderedUpdates(play,instructions,title,pointer)
     
@@ -49,6 +295,7 @@ def intro():
     pygame.mouse.set_visible(False)
     
     # ASSIGN 
+    renderer = HellBoundRender.Renderer(screen,background,DIRTY)
     clock = pygame.time.Clock()
     keepGoing = True
  
@@ -56,7 +303,7 @@ def intro():
     while keepGoing:
      
         # TIME
-        clock.tick(60)
+        clock.tick(FPS)
         
         # EVENT HANDLING
         for event in pygame.event.get():
@@ -82,11 +329,43 @@ def intro():
         pointer.set_pos(pygame.mouse.get_pos())
 
         # REFRESH SCREEN
-        allSprites.clear(screen, background)
         allSprites.update()
-        allSprites.draw(screen)
-        pygame.display.flip()
+        renderer.render(allSprites)
          
+def keyName(key):
+    '''Returns the name of a key as the help screen shows it, spelling out
+    the symbols the font does not have'''
+    name = pygame.key.name(key)
+    # Keypad keys are named like "[4]"
+    if len(name) > 2 and name.startswith("[") and name.endswith("]"):
+        name = "pad " + name[1:-1]
+    return KEY_NAMES.get(name,name).upper()
+
+def instructionsSprites():
+    '''Returns the text, pointer and return button of the instructions screen'''
+    title = HellBoundSprites.Label(460,30,40,"Help","center")
+    back = HellBoundSprites.Label(460,450,30,"Return","center")
+    text = pygame.sprite.Group(title)
+    
+    # One column for each key layout in HellBoundSim.KEYMAPS, side by side
+    width = HellBoundSim.SIZE[0] // len(HellBoundSim.KEYMAPS)
+    for index, keymap in enumerate(HellBoundSim.KEYMAPS):
+        left = width * index
+        keys = dict((bit,key) for key, bit in keymap)
+        text.add(HellBoundSprites.Label(left + width // 2,70,30,"Player " + str(index + 1),"center"))
+        for line, (bit, action) in enumerate(ACTIONS):
+            text.add(HellBoundSprites.Label(left + 15,30*line + 120,16,keyName(keys[bit]),"left"),
+                     HellBoundSprites.Label(left + 112,30*line + 120,16,action,"left"))
+    
+    # Any more players are bots
+    if HellBoundSim.MAX_PLAYERS > len(HellBoundSim.KEYMAPS):
+        text.add(HellBoundSprites.Label(460,350,20,"Players " + str(len(HellBoundSim.KEYMAPS) + 1) + " to " +
+                                        str(HellBoundSim.MAX_PLAYERS) + " are played by bots","center"))
+    
+    pointer = HellBoundSprites.Point()
+    
+    return text, pointer, back
+
 def instructions():
     '''This function displays the instructions screen'''
     
@@ -97,27 +376,11 @@ def instructions():
     pygame.display.set_caption("Help")
     
     # E - ENTITIES
-    background = pygame.image.load("rez/background.png")
+    background = HellBoundAssets.image("rez/background.png",alpha=False)
     screen.blit(background, (0,0))
     
-    # Sprites
-    title = HellBoundSprites.Label(460,30,40,"Help","center")
-    subtitle1 = HellBoundSprites.Label(200,60,30,"Player 1 Controls","center")
-    subtitle2 = HellBoundSprites.Label(720,60,30,"Player 2 Controls","center")
-    back = HellBoundSprites.Label(460,450,30,"Return","center")
-    
-    text1 = ("Player 1 uses", "W         Jump", "A         Left", "S         Crouch", "D         Right", "G         Sword Attack", "H         Fireball", "J         Defend")
-    text2 = ("Player 2 uses", "UP        Jump", "LEFT      Left", "DOWN      Crouch", "RIGHT     Right", "COMMA     Sword Attack", "PERIOD     Fireball", "SLASH     Defend")
-    paragraph1 = []
-    paragraph2 = []
-    
-    for line in range(len(text1)):
-        paragraph1.append(HellBoundSprites.Label(63,30*line + 100,20,text1[line],"left"))
-        paragraph2.append(HellBoundSprites.Label(583,30*line + 100,20,text2[line],"left"))
-        
-    text = pygame.sprite.Group(title,subtitle1,subtitle2,paragraph1,paragraph2)
-    
-    pointer = HellBoundSprites.Point()
+    # Sprites, built on the first visit
+    text, pointer, back = scenes.keep("instructions",instructionsSprites)
     
     allSprites = pygame.sprite.Group(pointer,text,back)
     
@@ -125,6 +388,7 @@ def instructions():
     pygame.mouse.set_visible(False)
     
     # ASSIGN 
+    renderer = HellBoundRender.Renderer(screen,background,DIRTY)
     clock = pygame.time.Clock()
     keepGoing = True
  
@@ -132,7 +396,7 @@ def instructions():
     while keepGoing:
      
         # TIME
-        clock.tick(60)
+        clock.tick(FPS)
         
         # EVENT HANDLING
         for event in pygame.event.get():
@@ -151,10 +415,8 @@ def instructions():
         pointer.set_pos(pygame.mouse.get_pos())
             
         # REFRESH SCREEN
-        allSprites.clear(screen, background)
         allSprites.update()
-        allSprites.draw(screen)
-        pygame.display.flip()
+        renderer.render(allSprites)
 
 def game():
     '''This function defines the game loop.'''
@@ -165,238 +427,254 @@ def game():
     pygame.display.set_caption("Fight!")
     
     # E - ENTITIES
-    background = pygame.image.load("rez/background.png")
+    background = HellBoundAssets.image("rez/background.png",alpha=False)
     screen.blit(background, (0, 0))
     
     # Background Music
-    pygame.mixer.music.load("music/background/game.mp3")
-    pygame.mixer.music.set_volume(0.3)
-    pygame.mixer.music.play(-1)
-    
-    # Sound Effects
-    block = pygame.mixer.Sound("music/fx/block.wav")
-    block.set_volume(0.5)
-    cut = pygame.mixer.Sound("music/fx/cut.wav")
-    cut.set_volume(0.5)
-    fireball = pygame.mixer.Sound("music/fx/fireball.wav")
-    fireball.set_volume(0.5)
-
+    scenes.music("music/background/game.mp3")
+    
+    # Sound Effects, on their own channels
+    voices = scenes.keep("voices",lambda: HellBoundAudio.Voices(EFFECTS))
+    
     # Sprites    
     
-    # Construct Level
-    platform = []
-    x=0
-    y=0
-    # Reads from a text document
-    for text in open("level.txt","r"):
-        for digit in text:
-            # If it is a 1, set a 30 by 1 platform
-            if str(digit) == str(1):
-                platform.append(HellBoundSprites.Platform(x,y))
-            x += 30
-        y += 30
-        x = 0
-        
-    health1 = HellBoundSprites.HealthBar(screen,(screen.get_width()/5)*2,30,"right")
-    health2 = HellBoundSprites.HealthBar(screen,(screen.get_width()/5)*3,30,"left")
-                
+    # A replay is watched with as many players, and the same rules, as it
+    # was recorded with
+    replay = None
+    if REPLAY:
+        replay = HellBoundReplay.Replay(REPLAY)
+        replay.check(LEVEL)
+    players = replay.players if replay else PLAYERS
+    if replay:
+        rules = replay.rules
+    elif BARRAGE:
+        rules = HellBoundSim.BARRAGE + (CLASHES,)
+    else:
+        rules = (HellBoundSim.FIREBALLS,HellBoundSim.COOLDOWN,CLASHES)
     
-    level = pygame.sprite.Group(platform)
+    # The match holds the level, players, healthbars and fireballs. The level
+    # is kept between matches, as it never changes.
+    level = scenes.keep(("level",LEVEL),lambda: HellBoundLevel.Level(LEVEL))
     
-    player1 = HellBoundSprites.Player(screen,"1",screen.get_width()/5,0,"right",level)
-    player2 = HellBoundSprites.Player(screen,"2",screen.get_width()/5*4,0,"left",level)
+    # Every fireball is made with the match, so firing makes nothing and reads nothing from disk
+    match = HellBoundSim.Match(level,screen,*rules,players=players)
     
-    endMessage1 = HellBoundSprites.Label(460,230,60,"Player 1 Wins!","center")
-    endMessage2 = HellBoundSprites.Label(460,230,60,"Player 2 Wins!","center")
+    # Draws the platforms onto the background once, instead of every frame
+    background = levelLayer.bake(background,match.level().sprites())
+    screen.blit(background, (0, 0))
+    
+    endMessages = [HellBoundSprites.Label(460,230,60,"Player " + str(number) + " Wins!","center")
+                   for number in range(1,players + 1)]
+    
+    allSprites = match.sprites
+    
+    # The round timer in seconds, drawn again only when the second changes
+    timer = HellBoundHUD.Text(lambda: match.frame() // HellBoundSim.RATE,460,18,30)
+    allSprites.add(timer)
     
-    players = pygame.sprite.Group(player1,player2)
-    proj1 = pygame.sprite.Group()
-    proj2 = pygame.sprite.Group()
-    allSprites = pygame.sprite.OrderedUpdates(player1,player2,level,health1,health2)
+    # Shows the profiler's timings while it is on
+    profiler = HellBoundProfile.profiler
+    overlay = HellBoundProfile.Overlay(profiler)
+    if profiler.enabled:
+        allSprites.add(overlay)
     
+    # Records the players' input, unless watching a replay
+    recorder = None
+    if RECORD and not replay:
+        recorder = HellBoundReplay.Recorder(RECORD,LEVEL,players=players,rules=match.rules())
+        
+    # Plays online, where the match only moves on with the peer's input
+    session = None
+    if PEER and not replay:
+        session = HellBoundNet.Session(match,SIDE,PORT,HellBoundNet.address(PEER),DELAY,LOSS)
+        
+    # Bots play the players without a key layout, each fighting the closest player
+    humans = min(players,len(HellBoundSim.KEYMAPS))
+    bots = []
+    if players > humans:
+        rng = random.Random()
+        bots = [HellBoundBots.BOTS[BOTS[index % len(BOTS)]](rng) for index in range(players - humans)]
     
     # ASSIGN 
+    renderer = HellBoundRender.Renderer(screen,background,DIRTY)
+    interpolator = HellBoundRender.Interpolator()
     clock = pygame.time.Clock()
+    step = 1.0 / HellBoundSim.RATE # Seconds simulated by each step
+    elapsed = 0.0                  # Seconds passed that are not simulated yet
     keepGoing = True
-    delay = 0
  
     # LOOP
     while keepGoing:
      
         # TIME
-        clock.tick(60)
+        # A fast replay simulates one step per frame, otherwise as many steps
+        # as fit in the time that passed, carrying the remainder to the next frame
+        if replay and FAST:
+            elapsed = step
+        else:
+            elapsed += min(clock.tick(FPS) / 1000.0,CATCH_UP)
      
         # EVENT HANDLING
+        profiler.start("events")
         for event in pygame.event.get():
             # Quits the game
             if event.type == pygame.QUIT:
                 STATE = "quit"
                 keepGoing = False
-        
-        pressed = pygame.key.get_pressed()
-        
-        # Do if healthbar 1 is not empty
-        if not health1.dead():
-            # Moves the player left
-            if pressed[pygame.K_a]:
-                player1.move(-6,"left")
-                player1.state("movement")
-            # Changes to crouch position
-            elif pressed[pygame.K_s]:
-                player1.state("crouch")
-            # Moves the player right
-            elif pressed[pygame.K_d]:
-                player1.move(6,"right")
-                player1.state("movement")
                 
-            # Attack/Defend
-            else:
-                # Sword attack
-                if pressed[pygame.K_g]:
-                    player1.state("attack")
-                    if player1.sound():
-                        cut.play()
-                # Shoots a fireball if there isn't one on the screen
-                elif pressed[pygame.K_h]:
-                    if len(proj1.sprites()) == 0: 
-                        projectile = HellBoundSprites.Projectile(screen,player1.get_projData())
-                        allSprites.add(projectile)
-                        proj1.add(projectile)
-                        fireball.play()
-                    else:
-                        player1.state("movement")
-                        player1.stop("x")
-                # Defending
-                elif pressed[pygame.K_j]:
-                    player1.state("defend")
-                    if player1.sound():
-                        block.play()
-                # Otherwise, movement
+            # Turns the profiler and its overlay on and off
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.setEnabled(not profiler.enabled,PROFILED)
+                if profiler.enabled:
+                    allSprites.add(overlay)
                 else:
-                    player1.stop("x")
-                    player1.state("movement")
-                
-            # Jumping
-            if pressed[pygame.K_w]:
-                player1.jump()
-                
-        # Tells the player to die if healthbar1 is empty
-        else:
-            player1.dead(True)
-            
-        # Do if healthbar 2 is not empty
-        if not health2.dead():
-            # Moves the player left
-            if pressed[pygame.K_LEFT]:
-                player2.move(-6,"left")
-                player2.state("movement")
-            # Changes to crouch position
-            elif pressed[pygame.K_DOWN]:
-                player2.state("crouch")
-            # Moves the player right
-            elif pressed[pygame.K_RIGHT]:
-                player2.move(6,"right")
-                player2.state("movement")
-                
-            # Attacking/Defending
-            else:
-                # Sword attack
-                if pressed[pygame.K_COMMA]:
-                    player2.state("attack")
-                    if player2.sound():
-                        cut.play()
-                # Shoots a fireball if there isn't one on the screen
-                elif pressed[pygame.K_PERIOD]:
-                    if len(proj2.sprites()) == 0: 
-                        projectile = HellBoundSprites.Projectile(screen,player2.get_projData())
-                        allSprites.add(projectile)
-                        proj2.add(projectile)
-                        fireball.play()
-                    else: 
-                        player2.state("movement")
-                        player2.stop("x")
-                # Defending
-                elif pressed[pygame.K_SLASH]:
-                    player2.state("defend")
-                    if player2.sound():
-                        block.play()
-                # Otherwise Movement
-                else:
-                    player2.stop("x")
-                    player2.state("movement")
-            # Jumping
-            if pressed[pygame.K_UP]:
-                player2.jump()
-        # Tells the player to die if healthbar 2 is empty
-        else:
-            player2.dead(True)
+                    overlay.kill()
+        profiler.stop("events")
+        
+        # Reads the keyboard once per frame, every step of the frame uses it
+        if not replay:
+            profiler.start("keys")
+            pressed = pygame.key.get_pressed()
+            keys = [HellBoundSim.keyBits(pressed,keymap) for keymap in HellBoundSim.KEYMAPS[:humans]]
+            profiler.stop("keys")
+        
+        # Sprites that move between steps
+        moving = match.players + match.markers + [projectile for proj in match.projs for projectile in proj]
+        
+        while keepGoing and elapsed >= step:
+            elapsed -= step
             
-        # COLLISION DETECTION
-        if player1.rect.colliderect(player2.rect):
-            # If player 1 is attacking
-            if player1.damage():
-                # Reduced damage if player 2 is defending
-                if player2.defend():
-                    health2.loseHealth(2)
-                # Full damage if player 2 is not
-                else:
-                    health2.loseHealth(10)
-            # If player 2 is attacking
-            if player2.damage():
-                # Reduced damage if player 1 is defending
-                if player1.defend():
-                    health1.loseHealth(2)
-                # Full damage if player 1 is not
-                else:
-                    health1.loseHealth(10)
+            # Online, once the match is over the peers stop playing and agree
+            # on the frame it ended on, before going back to the intro
+            if session and match.over():
+                elapsed = 0.0
+                if session.finish():
+                    STATE = "intro"
+                    keepGoing = False
+                break
             
-        # Fireball collisions only do damage if the enemy is not defending, and will only affect your enemy
-        if pygame.sprite.spritecollide(player1, proj2, False) and not player1.defend():
-            health1.loseHealth(2)
+            # Reads the input from the replay, quitting once it runs out
+            if replay:
+                if match.frame() >= len(replay):
+                    STATE = "quit"
+                    keepGoing = False
+                    break
+                bits = replay.bits(match.frame())
+            else:
+                # Bots decide every step, as they watch the match
+                bits = keys + [bots[index].act(match,player,match.nearest(player))
+                               for index, player in enumerate(match.players[humans:])]
+                if recorder and not session:
+                    recorder.record(*bits)
             
-        if pygame.sprite.spritecollide(player2, proj1, False) and not player2.defend():
-            health2.loseHealth(2)
+            # Moves the match forward one step, and plays the sounds it asks for
+            interpolator.capture(moving)
+            if session:
+                played = session.step(keys[0] | keys[1])
+                # Waits for the peer, without catching up on the time spent waiting
+                if played is None:
+                    elapsed = 0.0
+                    break
+            else:
+                played = match.step(*bits)
+            for sound in played:
+                voices.play(sound)
+            moving = match.players + match.markers + [projectile for proj in match.projs for projectile in proj]
             
-        # Displays a message of who wins, and starts 5 second delay
-        if health1.dead():
-            if endMessage2.alive() == False:
-                allSprites.add(endMessage2)
-            delay += 1
-        if health2.dead():
-            if endMessage1.alive() == False:
-                allSprites.add(endMessage1)
-            delay += 1
-        
-        # Sets back to intro once 5 second delay is over
-        if delay == 300:
+            # Sets back to intro once 5 second delay is over
+            if match.over() and not session:
+                STATE = "intro"
+                keepGoing = False
+                
+                # A replay ends the game once it has been watched
+                if replay:
+                    STATE = "quit"
+                    
+        # Goes back to the intro if the peer has left, or plays with other
+        # rules, as the two matches would not stay the same
+        if session and session.lost():
             STATE = "intro"
             keepGoing = False
-            
+        if session and session.conflict():
+            sys.stderr.write("The peer plays with different rules, eg. --barrage or --clash, so the match was left\n")
+            STATE = "intro"
+            keepGoing = False
+        
+        # Displays a message of who wins once every other player is dead,
+        # online a rollback can take it back. The last player's is added
+        # first, so if all die together the first player's is on top.
+        dead = [health.dead() for health in match.healths]
+        fallen = sum(dead)
+        for index in reversed(range(players)):
+            won = fallen - dead[index] == players - 1
+            if won and endMessages[index].alive() == False:
+                allSprites.add(endMessages[index])
+            elif not won and endMessages[index].alive():
+                endMessages[index].kill()
+                    
         # REFRESH SCREEN
-        allSprites.clear(screen, background)
-        allSprites.update()
-        allSprites.draw(screen)
-        pygame.display.flip()
+        # Draws moving sprites the fraction of a step that has passed since the last one
+        if INTERPOLATE:
+            interpolator.apply(moving,elapsed / step)
+        renderer.render(allSprites)
+        interpolator.restore()
         
+    # Stops any effect still playing, so it does not carry on over the next scene
+    voices.stop()
+    
+    # Online, the recording holds the input both sides agreed on
+    if session:
+        if recorder:
+            bits1, bits2 = session.inputs()
+            for frame in range(len(bits1)):
+                recorder.record(bits1[frame],bits2[frame])
+        session.close()
+    if recorder:
+        recorder.close()
      
 # Call the main function
-def main():
-    '''This function defines the mainline logic for our game.'''
-    playing = True
+def main(arguments=None):
+    '''This function defines the mainline logic for our game. Takes a list
+    of command line arguments, or None to keep the options as they are.'''
+    global screen, STATE
+    if arguments is not None:
+        configure(arguments)
+        
+    # Only the display is started here, fonts and sound start when first used
+    pygame.display.init()
+    screen = pygame.display.set_mode(HellBoundSim.SIZE)
+    
+    # Starts profiling, if asked to
+    if PROFILE or TRACE:
+        HellBoundProfile.profiler.tracing = TRACE is not None
+        HellBoundProfile.profiler.setEnabled(True,PROFILED)
+    
+    # Goes straight to the match when watching a replay
+    if REPLAY:
+        STATE = "play"
+        
+    # Loads every asset while the loading screen runs
+    if PRELOAD:
+        loading(HellBoundAssets.Preloader(preloadJobs()))
+    
     # Calls the other functions depending on what state the game is in.
-    while playing:
-        if STATE == "intro":
-            intro()
-        if STATE == "instructions":
-            instructions()
-        if STATE == "play":
-            game()
-        if STATE == "quit":
-            playing = False
+    scenes.run()
             
     # Unhide the mouse pointer
     pygame.mouse.set_visible(True)
     
+    # Saves the profiler's timings
+    if TRACE:
+        HellBoundProfile.profiler.export(TRACE)
+    
+    # Kept sprites hold fonts and images that pygame.quit() invalidates
+    scenes.clear()
     pygame.quit()
-main()
-    
\ No newline at end of file
+
+# The function run for each STATE
+scenes.add("intro",intro)
+scenes.add("instructions",instructions)
+scenes.add("play",game)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,260 @@
+""" Author: Anson Tran
+
+    Description: A process-wide cache for the images, fonts and sounds used by
+                 HellBound. Every asset is loaded from disk once, converted to
+                 the display format once, flipped once, and then shared by
+                 every sprite and scene that asks for it. An optional memory
+                 budget evicts the least recently used assets. Rendered
+                 text is kept too, so labels showing the same string share
+                 one surface, and changing numbers are put together from
+                 digits that were already rendered. A Preloader
+                 fills the cache on a worker thread, while a loading screen
+                 keeps the window responsive.
+"""
+
+import os, io, re, threading, pygame
+from collections import OrderedDict
+
+# Splits text into the runs composed text is made of: each digit on its own,
+# and the text between digits as a whole
+RUNS = re.compile(r"[0-9]|[^0-9]+")
+
+class AssetCache(object):
+    '''This class defines a keyed cache of images, fonts and sounds'''
+    def __init__(self,budget=None,texts=256):
+        '''The initializer takes an optional memory budget in bytes. None means
+        the cache never evicts anything. texts is the most rendered strings kept.'''
+        self.__assets = OrderedDict() # Key -> [asset, size in bytes, converted]
+        self.__texts = OrderedDict()  # (path, size, text, colour, antialias) -> rendered surface
+        self.__textLimit = texts
+        self.__budget = budget        # Maximum number of bytes held
+        self.__used = 0               # Number of bytes currently held
+        self.hits = 0                 # Number of requests served from memory
+        self.misses = 0               # Number of requests that went to disk
+        self.__lock = threading.RLock() # Lets a preloader fill the cache from another thread
+
+    def image(self,path,flip=False,alpha=True,convert=True):
+        '''Returns the image at path, converted to the display format. If flip is
+        True, the image is mirrored horizontally. alpha should be False for
+        images without transparency, such as backgrounds. convert should be
+        False off the main thread, the image is then converted on the next
+        request that allows it. An image asked for with and without alpha is
+        kept once for each, as they are converted to different formats.'''
+        key = ("image",path,flip,alpha)
+        with self.__lock:
+            entry = self.__lookup(key)
+
+            # Loads the image, flipping the cached original instead of reading it again
+            if entry is None:
+                if flip:
+                    surface = pygame.transform.flip(self.image(path,False,alpha,convert),True,False)
+                else:
+                    surface = pygame.image.load(path)
+                entry = self.__store(key,surface,self.__surfaceSize(surface))
+
+            # Converts the image once a display exists, images loaded before
+            # the window was opened are converted on their next request
+            if convert and not entry[2] and pygame.display.get_surface() is not None:
+                if alpha:
+                    entry[0] = entry[0].convert_alpha()
+                else:
+                    entry[0] = entry[0].convert()
+                entry[2] = True
+
+            return entry[0]
+
+    def font(self,path,size):
+        '''Returns the font at path with the requested size'''
+        key = ("font",path,size)
+        with self.__lock:
+            entry = self.__lookup(key)
+            if entry is None:
+                startFont()
+                entry = self.__store(key,pygame.font.Font(path,size),os.path.getsize(path))
+            return entry[0]
+
+    def sound(self,path):
+        '''Returns the decoded sound at path. The sound is shared, so its
+        volume is left alone; set the volume of the channel it plays on.'''
+        key = ("sound",path)
+        with self.__lock:
+            entry = self.__lookup(key)
+            if entry is None:
+                startMixer()
+                sound = pygame.mixer.Sound(path)
+                entry = self.__store(key,sound,self.__soundSize(sound))
+            return entry[0]
+
+    def text(self,path,size,message,color,antialias=True):
+        '''Returns message rendered in the font at path with the requested size.
+        The surface is shared, so it must not be drawn on.'''
+        key = (path,size,message,tuple(color),antialias)
+        with self.__lock:
+            surface = self.__texts.get(key)
+            if surface is None:
+                surface = self.font(path,size).render(message,antialias,color)
+                self.__texts[key] = surface
+                if len(self.__texts) > self.__textLimit:
+                    self.__texts.popitem(last=False)
+            else:
+                self.__texts.move_to_end(key)
+            return surface
+
+    def compose(self,path,size,message,color,antialias=True):
+        '''Returns message put together from cached runs of text, for strings
+        that change often, such as timers and scores. Digits are rendered one
+        at a time and the text between them as a whole, so a new number only
+        costs a few blits.'''
+        runs = [self.text(path,size,run,color,antialias) for run in RUNS.findall(message)]
+        if len(runs) <= 1:
+            return self.text(path,size,message,color,antialias)
+        surface = pygame.Surface((sum(run.get_width() for run in runs),max(run.get_height() for run in runs)),pygame.SRCALPHA,32)
+        surface.fill((0,0,0,0))
+        x = 0
+        for run in runs:
+            # BLEND_RGBA_MAX onto the empty surface copies the pixels exactly
+            surface.blit(run,(x,0),special_flags=pygame.BLEND_RGBA_MAX)
+            x += run.get_width()
+        return surface
+
+    def music(self,path):
+        '''Returns a music file held in memory, as a new file object for
+        pygame.mixer.music.load(), so changing tracks does not read the disk'''
+        key = ("music",path)
+        with self.__lock:
+            entry = self.__lookup(key)
+            if entry is None:
+                source = open(path,"rb")
+                data = source.read()
+                source.close()
+                entry = self.__store(key,data,len(data))
+            return io.BytesIO(entry[0])
+
+    def clear(self):
+        '''Drops every cached asset'''
+        with self.__lock:
+            self.__assets.clear()
+            self.__texts.clear()
+            self.__used = 0
+
+    def __lookup(self,key):
+        '''Returns the entry for key and marks it as recently used, or None'''
+        entry = self.__assets.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.__assets.move_to_end(key)
+        return entry
+
+    def __store(self,key,asset,size):
+        '''Adds an asset to the cache and evicts old assets if over budget'''
+        entry = [asset,size,False]
+        self.__assets[key] = entry
+        self.__used += size
+        self.__evict()
+        return entry
+
+    def __evict(self):
+        '''Removes least recently used assets until the cache fits its budget.
+        The newest asset is always kept, even if it is larger than the budget.'''
+        if self.__budget is None:
+            return
+        while self.__used > self.__budget and len(self.__assets) > 1:
+            key, entry = self.__assets.popitem(last=False)
+            self.__used -= entry[1]
+
+    def __surfaceSize(self,surface):
+        '''Returns the number of bytes used by a surface's pixels'''
+        return surface.get_pitch() * surface.get_height()
+
+    def __soundSize(self,sound):
+        '''Returns the number of bytes used by a decoded sound'''
+        mixer = pygame.mixer.get_init()
+        if mixer is None:
+            return 0
+        frequency, format, channels = mixer
+        return int(sound.get_length() * frequency * channels * abs(format) / 8)
+
+class Preloader(threading.Thread):
+    '''This class runs a list of loading jobs on a worker thread. Each job is
+    a function that puts an asset in a cache, eg.
+        functools.partial(cache.sound,"music/fx/cut.wav")
+    Images should be loaded with convert=False, and are converted on the
+    main thread the first time they are used.'''
+    def __init__(self,jobs):
+        '''The initializer takes the list of jobs'''
+        threading.Thread.__init__(self)
+        self.daemon = True          # Does not keep the game open if the window is closed while loading
+        self.__jobs = list(jobs)
+        self.__done = 0             # Number of jobs finished
+        self.error = None           # The exception that stopped the loading, if any
+
+    def run(self):
+        '''Runs every job, stopping at the first one that fails'''
+        try:
+            for job in self.__jobs:
+                job()
+                self.__done += 1
+        except Exception as error:
+            self.error = error
+
+    def progress(self):
+        '''Returns the fraction of jobs finished, from 0 to 1'''
+        if not self.__jobs:
+            return 1.0
+        return self.__done / float(len(self.__jobs))
+
+    def finished(self):
+        '''Tells us whether the worker has stopped, raising the error that stopped it if any'''
+        if self.is_alive():
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+def startFont():
+    '''Starts pygame's font module the first time a font is needed'''
+    if not pygame.font.get_init():
+        pygame.font.init()
+
+def startMixer():
+    '''Starts the mixer the first time a sound or music is needed'''
+    if pygame.mixer.get_init() is None:
+        pygame.mixer.init()
+
+def displayFormat(surface,alpha=True):
+    '''Converts a surface to the display format, or returns it unchanged if
+    there is no window, eg. in headless simulations'''
+    if pygame.display.get_surface() is None:
+        return surface
+    if alpha:
+        return surface.convert_alpha()
+    return surface.convert()
+
+# The cache shared by every sprite and scene
+cache = AssetCache()
+
+def image(path,flip=False,alpha=True,convert=True):
+    '''Returns a cached image from the shared cache'''
+    return cache.image(path,flip,alpha,convert)
+
+def font(path,size):
+    '''Returns a cached font from the shared cache'''
+    return cache.font(path,size)
+
+def sound(path):
+    '''Returns a cached sound from the shared cache'''
+    return cache.sound(path)
+
+def music(path):
+    '''Returns a music file held in the shared cache'''
+    return cache.music(path)
+
+def text(path,size,message,color,antialias=True):
+    '''Returns rendered text from the shared cache'''
+    return cache.text(path,size,message,color,antialias)
+
+def compose(path,size,message,color,antialias=True):
+    '''Returns text composed from runs in the shared cache'''
+    return cache.compose(path,size,message,color,antialias)
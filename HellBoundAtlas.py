@@ -0,0 +1,91 @@
+""" Author: Anson Tran
+
+    Description: An offline packer for the animation frames in rez/. Every
+                 frame of rez/characterN and rez/projectileN is packed, facing
+                 right and flipped to face left, into one atlas image per
+                 player (rez/atlas/playerN.png). A compact index
+                 (rez/atlas/playerN.idx) maps each frame to its rect.
+
+                 Run "python HellBoundAtlas.py" after changing any frame.
+"""
+
+import os, re, pygame
+
+# Folder the atlases are written to
+ATLAS_DIR = "rez/atlas"
+
+# Widest an atlas is allowed to be
+ATLAS_WIDTH = 1024
+
+# Pixels left empty around each frame
+PADDING = 1
+
+def frames(playerNum):
+    '''Returns a list of (sheet, animation, number, path) for every frame a player uses'''
+    found = []
+    for sheet in ("character","projectile"):
+        folder = "rez/" + sheet + playerNum
+        for name in sorted(os.listdir(folder)):
+            # Frame files are named animation + number, eg. "attack3.png"
+            match = re.match(r"([a-z]+)(\d+)\.png$",name)
+            if match:
+                found.append((sheet,match.group(1),int(match.group(2)),folder + "/" + name))
+    return found
+
+def shelves(sizes,width):
+    '''Packs a list of (w,h) sizes into rows, tallest first. Returns a list
+    of (x,y) positions in the same order as sizes, and the total height.'''
+    order = sorted(range(len(sizes)),key=lambda index: (-sizes[index][1],-sizes[index][0]))
+    positions = [None] * len(sizes)
+    x = 0
+    y = 0
+    rowHeight = 0
+    for index in order:
+        w, h = sizes[index]
+        # Starts a new row if the frame does not fit on this one
+        if x + w + PADDING > width:
+            x = 0
+            y += rowHeight
+            rowHeight = 0
+        positions[index] = (x,y)
+        x += w + PADDING
+        rowHeight = max(rowHeight,h + PADDING)
+    return positions, y + rowHeight
+
+def pack(playerNum):
+    '''Builds the atlas image and index for a player, and returns the number of frames packed'''
+    # Loads every frame, and a flipped copy facing left
+    images = []
+    for sheet, animation, number, path in frames(playerNum):
+        image = pygame.image.load(path)
+        images.append((sheet,animation,"right",number,image))
+        images.append((sheet,animation,"left",number,pygame.transform.flip(image,True,False)))
+
+    positions, height = shelves([image[4].get_size() for image in images],ATLAS_WIDTH)
+    width = max(x + image[4].get_width() for (x, y), image in zip(positions,images))
+
+    # Copies the frames onto a transparent atlas. BLEND_RGBA_MAX onto an empty
+    # surface copies the pixels exactly, instead of blending them.
+    atlas = pygame.Surface((width,height),pygame.SRCALPHA,32)
+    atlas.fill((0,0,0,0))
+    lines = []
+    for (x, y), (sheet, animation, facing, number, image) in zip(positions,images):
+        atlas.blit(image,(x,y),special_flags=pygame.BLEND_RGBA_MAX)
+        lines.append(" ".join([sheet,animation,facing,str(number),str(x),str(y),str(image.get_width()),str(image.get_height())]))
+
+    if not os.path.isdir(ATLAS_DIR):
+        os.makedirs(ATLAS_DIR)
+    pygame.image.save(atlas,ATLAS_DIR + "/player" + playerNum + ".png")
+    index = open(ATLAS_DIR + "/player" + playerNum + ".idx","w")
+    index.write("\n".join(lines) + "\n")
+    index.close()
+    return len(images)
+
+def main():
+    '''Packs the atlases for both players'''
+    for playerNum in ("1","2"):
+        count = pack(playerNum)
+        print("player" + playerNum + ": " + str(count) + " frames")
+
+if __name__ == "__main__":
+    main()
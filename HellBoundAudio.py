@@ -0,0 +1,87 @@
+""" Author: Anson Tran
+
+    Description: Plays HellBound's sound effects. Each effect gets its own
+                 mixer channels, reserved so nothing else plays on them, and
+                 so effects can never steal each other's channels. An effect
+                 triggered again within its cooldown is merged with the one
+                 already playing instead of starting another voice, and when
+                 all of an effect's channels are busy, its oldest voice is
+                 restarted. Effects are decoded once, by the asset cache.
+"""
+
+import pygame, HellBoundAssets
+
+class Effect(object):
+    '''This class describes how a sound effect is played'''
+    def __init__(self,path,volume=1.0,voices=1,cooldown=0):
+        '''The initializer takes the sound's path, its volume, the most copies
+        that may play at once, and the milliseconds after it starts during
+        which it is not started again'''
+        self.path = path
+        self.volume = volume
+        self.voices = voices
+        self.cooldown = cooldown
+
+class Voices(object):
+    '''This class plays sound effects on channels reserved for each one'''
+    def __init__(self,effects):
+        '''The initializer takes a dictionary of effect name -> Effect'''
+        self.__sounds = {}     # Name -> decoded sound
+        self.__channels = {}   # Name -> channels reserved for the effect
+        self.__started = {}    # Name -> list of times each channel last started, in ms
+        self.__last = {}       # Name -> time the effect last started, in ms
+        self.__effects = effects
+        self.played = 0        # Number of voices started
+        self.merged = 0        # Number of triggers merged with a voice already playing
+        self.stolen = 0        # Number of voices restarted because all were busy
+
+        # Reserves the first channels for the effects, in name order so the
+        # same effect always gets the same channels
+        HellBoundAssets.startMixer()
+        total = sum(effect.voices for effect in effects.values())
+        if pygame.mixer.get_num_channels() < total:
+            pygame.mixer.set_num_channels(total)
+        pygame.mixer.set_reserved(total)
+        channel = 0
+        for name in sorted(effects):
+            effect = effects[name]
+            self.__sounds[name] = HellBoundAssets.sound(effect.path)
+            self.__channels[name] = [pygame.mixer.Channel(channel + voice) for voice in range(effect.voices)]
+            self.__started[name] = [None] * effect.voices
+            channel += effect.voices
+
+    def play(self,name,now=None):
+        '''Plays an effect, unless it started less than its cooldown ago.
+        now is the time in milliseconds, pygame.time.get_ticks() by default.'''
+        if now is None:
+            now = pygame.time.get_ticks()
+        effect = self.__effects[name]
+        last = self.__last.get(name)
+        if last is not None and now - last < effect.cooldown:
+            self.merged += 1
+            return
+
+        # Uses a free channel, or restarts the voice that has played longest
+        channels = self.__channels[name]
+        started = self.__started[name]
+        voice = None
+        for index in range(len(channels)):
+            if not channels[index].get_busy():
+                voice = index
+                break
+        if voice is None:
+            voice = min(range(len(channels)),key=lambda index: started[index] or 0)
+            self.stolen += 1
+        # The volume is the channel's, as the sound is shared through the cache
+        channels[voice].play(self.__sounds[name])
+        channels[voice].set_volume(self.__effects[name].volume)
+        started[voice] = now
+        self.__last[name] = now
+        self.played += 1
+
+    def stop(self):
+        '''Stops every effect playing'''
+        for name in self.__channels:
+            for channel in self.__channels[name]:
+                channel.stop()
+        self.__last = {}
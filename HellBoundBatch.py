@@ -0,0 +1,436 @@
+""" Author: Anson Tran
+
+    Description: Runs thousands of HellBound duels at once with NumPy, for
+                 balance tuning. Every value a Player, Projectile and
+                 HealthBar keeps is stored as an array with one row per
+                 match and one column per player, and a step advances every
+                 match with the same rules as HellBoundSim.Match.step().
+                 The numbers being tuned (damage, gravity, jump, fireball
+                 acceleration, ...) are arguments of the simulator.
+
+                 Run "python HellBoundBatch.py [matches]" to time a batch of
+                 random matches. Needs NumPy, which the game itself does not.
+"""
+
+import os, re, numpy, HellBoundLevel, HellBoundSim
+
+# Animations, in the order of the frame size tables
+ANIMATIONS = ("sprint","jump","crouch","defend","attack","dying","idle")
+SPRINT, JUMPING, CROUCHING, DEFENDING, ATTACKING, DYING, IDLE = range(len(ANIMATIONS))
+
+# Frames each animation lasts, and frames per image (-1 is one image per frame)
+TIMING = {SPRINT: (1,-1), JUMPING: (8,-1), CROUCHING: (60,30), DEFENDING: (12,-1),
+          ATTACKING: (32,4), DYING: (100,20), IDLE: (120,30)}
+
+# Player states
+MOVEMENT, ATTACK, DEFEND, CROUCH = range(4)
+
+# Facing directions
+RIGHT, LEFT = range(2)
+
+def frameSizes(playerNum):
+    '''Returns ({(sheet, animation, number): (width, height)}) for a player's
+    frames, read from the atlas index, or from the frames if there is none'''
+    sizes = {}
+    index = "rez/atlas/player" + playerNum + ".idx"
+    if os.path.isfile(index):
+        for line in open(index,"r"):
+            values = line.split()
+            if len(values) == 8 and values[2] == "right":
+                sizes[(values[0],values[1],int(values[3]))] = (int(values[6]),int(values[7]))
+        return sizes
+
+    import pygame
+    for sheet in ("character","projectile"):
+        folder = "rez/" + sheet + playerNum
+        for name in os.listdir(folder):
+            match = re.match(r"([a-z]+)(\d+)\.png$",name)
+            if match:
+                sizes[(sheet,match.group(1),int(match.group(2)))] = pygame.image.load(folder + "/" + name).get_size()
+    return sizes
+
+def roundRect(values):
+    '''Rounds like a pygame Rect does when given a float, half away from zero'''
+    return numpy.where(values >= 0,numpy.floor(values + 0.5),numpy.ceil(values - 0.5)).astype(numpy.int64)
+
+class BatchSim(object):
+    '''This class defines a batch of duels, all stepped together'''
+    def __init__(self,matches,level="level.txt",width=HellBoundSim.SIZE[0],damage=10,blockDamage=2,
+                 fireballDamage=2,gravity=0.5,jump=10,acceleration=0.35,speed=6,lunge=25,health=200):
+        '''The initializer takes the number of matches, the level, the width of
+        the arena, and the rules to play by. The defaults are the game's rules.'''
+        self.matches = matches
+        self.width = width
+        self.damage = damage
+        self.blockDamage = blockDamage
+        self.fireballDamage = fireballDamage
+        self.gravity = gravity
+        self.jump = jump
+        self.acceleration = acceleration
+        self.speed = speed
+        self.lunge = lunge
+
+        self.__loadSizes()
+        self.__loadLevel(level)
+
+        shape = (matches,2)
+        self.__column = numpy.array([[0,1]])   # Player index of each column, for size lookups
+
+        # Players start in the air, in their first jump image
+        self.w = numpy.empty(shape,numpy.int64)
+        self.h = numpy.empty(shape,numpy.int64)
+        self.w[:] = self.__playerW[self.__column,JUMPING,0]
+        self.h[:] = self.__playerH[self.__column,JUMPING,0]
+        self.x = roundRect(numpy.array([[width / 5.0,width / 5.0 * 4]])) - self.w // 2
+        self.y = numpy.zeros(shape,numpy.int64)
+        self.facing = numpy.empty(shape,numpy.int64)
+        self.facing[:] = (RIGHT,LEFT)
+        self.count = numpy.zeros(shape,numpy.int64)
+        self.changeX = numpy.zeros(shape,numpy.int64)
+        self.changeY = numpy.zeros(shape,numpy.float64)
+        self.air = numpy.ones(shape,bool)
+        self.state = numpy.full(shape,MOVEMENT,numpy.int64)
+        self.animation = numpy.full(shape,JUMPING,numpy.int64)
+        self.damaging = numpy.zeros(shape,bool)
+        self.defending = numpy.zeros(shape,bool)
+        self.dead = numpy.zeros(shape,bool)
+        self.sound = numpy.zeros(shape,bool)
+
+        # Health bars
+        self.health = numpy.full(shape,health,numpy.int64)
+        self.healthDead = numpy.zeros(shape,bool)
+
+        # One fireball per player, like the game allows
+        self.projAlive = numpy.zeros(shape,bool)
+        self.projX = numpy.zeros(shape,numpy.int64)
+        self.projY = numpy.zeros(shape,numpy.int64)
+        self.projW = numpy.zeros(shape,numpy.int64)
+        self.projH = numpy.zeros(shape,numpy.int64)
+        self.projCentreY = numpy.zeros(shape,numpy.int64)
+        self.projCount = numpy.zeros(shape,numpy.int64)
+        self.projSpeed = numpy.zeros(shape,numpy.float64)
+        self.projFacing = numpy.zeros(shape,numpy.int64)
+
+        # Results
+        self.delay = numpy.zeros(matches,numpy.int64)
+        self.frames = numpy.zeros(matches,numpy.int64)          # Frames played until the match ended
+        self.winner = numpy.full(matches,-1,numpy.int64)         # -1 while running, 0 for a draw, else 1 or 2
+        self.damageDealt = numpy.zeros(shape,numpy.int64)        # Damage each player has done
+        self.fireballs = numpy.zeros(shape,numpy.int64)          # Fireballs each player has shot
+
+    def __loadSizes(self):
+        '''Builds tables of frame sizes: [player, animation, frame] and [player, frame]'''
+        frames = max((number - 1) // delay if delay != -1 else number - 1 for number, delay in TIMING.values()) + 1
+        self.__playerW = numpy.zeros((2,len(ANIMATIONS),frames),numpy.int64)
+        self.__playerH = numpy.zeros((2,len(ANIMATIONS),frames),numpy.int64)
+        self.__projW = numpy.zeros((2,6),numpy.int64)
+        self.__projH = numpy.zeros((2,6),numpy.int64)
+        for player, playerNum in enumerate(("1","2")):
+            sizes = frameSizes(playerNum)
+            for animation, name in enumerate(ANIMATIONS):
+                for number in range(frames):
+                    size = sizes.get(("character",name,number))
+                    if size is not None:
+                        self.__playerW[player,animation,number], self.__playerH[player,animation,number] = size
+            for number in range(6):
+                self.__projW[player,number], self.__projH[player,number] = sizes[("projectile","projectile",number)]
+
+    def __loadLevel(self,level):
+        '''Builds a table counting the platforms before each cell of each row'''
+        if isinstance(level,HellBoundLevel.Level):
+            level = level.path()
+        spans = HellBoundLevel.spans(level)
+        rows = max([row for column, row, length in spans] + [0]) + 1
+        columns = max([column + length for column, row, length in spans] + [1])
+        solid = numpy.zeros((rows,columns),numpy.int64)
+        for column, row, length in spans:
+            solid[row,column:column + length] = 1
+        self.__solid = numpy.zeros((rows,columns + 1),numpy.int64)
+        self.__solid[:,1:] = numpy.cumsum(solid,axis=1)
+        self.__tile = HellBoundLevel.TILE
+
+    def step(self,bits1,bits2):
+        '''Simulates one frame of every match. bits1 and bits2 are arrays with
+        one set of HellBoundSim input bits per match.'''
+        bits = numpy.stack([numpy.asarray(bits1),numpy.asarray(bits2)],axis=1)
+        running = self.winner == -1
+
+        self.__control(bits)
+        self.__collide(running)
+
+        # Counts down to the end of the match once a player is dead
+        self.delay += self.healthDead.sum(axis=1)
+
+        # Moves every sprite, in the same order as the game
+        self.__updatePlayers()
+        self.__updateHealth()
+        self.__updateProjectiles()
+
+        # Records the result of matches that just ended
+        self.frames += running
+        ended = running & (self.delay >= HellBoundSim.END_DELAY)
+        result = numpy.where(self.healthDead[:,0] & self.healthDead[:,1],0,numpy.where(self.healthDead[:,1],1,2))
+        self.winner[ended] = result[ended]
+
+    def over(self):
+        '''Tells us whether every match has finished'''
+        return bool((self.winner != -1).all())
+
+    def __control(self,bits):
+        '''Applies both players' input bits, like Match.__control'''
+        # Tells the player to die if its healthbar is empty
+        self.dead |= self.healthDead
+        active = ~self.healthDead
+
+        left = active & (bits & HellBoundSim.LEFT != 0)
+        crouch = active & ~left & (bits & HellBoundSim.CROUCH != 0)
+        right = active & ~left & ~crouch & (bits & HellBoundSim.RIGHT != 0)
+        other = active & ~left & ~crouch & ~right
+        attack = other & (bits & HellBoundSim.ATTACK != 0)
+        fireball = other & ~attack & (bits & HellBoundSim.FIREBALL != 0)
+        defend = other & ~attack & ~fireball & (bits & HellBoundSim.DEFEND != 0)
+        idle = other & ~attack & ~fireball & ~defend
+
+        # Moving left or right
+        self.changeX[left] = -self.speed
+        self.facing[left] = LEFT
+        self.changeX[right] = self.speed
+        self.facing[right] = RIGHT
+        self.state[left | right] = MOVEMENT
+        self.state[crouch] = CROUCH
+
+        # Sword attack and defending
+        self.state[attack] = ATTACK
+        self.state[defend] = DEFEND
+
+        # Shoots a fireball if there isn't one on the screen
+        shoot = fireball & ~self.projAlive
+        self.__spawnProjectiles(shoot)
+        self.fireballs += shoot
+        blocked = fireball & ~shoot
+        self.state[blocked | idle] = MOVEMENT
+        self.changeX[blocked | idle] = 0
+
+        # Jumping
+        jump = active & (bits & HellBoundSim.JUMP != 0) & ~self.air
+        self.air[jump] = True
+        self.changeY[jump] -= self.jump
+
+    def __spawnProjectiles(self,shoot):
+        '''Starts a fireball in front of each player in shoot, like Projectile.__init__'''
+        if not shoot.any():
+            return
+        w = self.__projW[self.__column,0]
+        h = self.__projH[self.__column,0]
+        startX = numpy.where(self.facing == RIGHT,self.x + self.w,self.x)
+        centreY = self.y + self.h // 2
+        self.projAlive |= shoot
+        self.projFacing = numpy.where(shoot,self.facing,self.projFacing)
+        self.projX = numpy.where(shoot,startX,self.projX)
+        self.projCentreY = numpy.where(shoot,centreY,self.projCentreY)
+        self.projW = numpy.where(shoot,w,self.projW)
+        self.projH = numpy.where(shoot,h,self.projH)
+        self.projY = numpy.where(shoot,centreY - h // 2,self.projY)
+        self.projCount[shoot] = 0
+        self.projSpeed[shoot] = self.acceleration
+
+    def __overlap(self,x1,y1,w1,h1,x2,y2,w2,h2):
+        '''Tells us which pairs of rects overlap, like Rect.colliderect'''
+        return ((x1 < x2 + w2) & (x2 < x1 + w1) & (y1 < y2 + h2) & (y2 < y1 + h1) &
+                (w1 > 0) & (h1 > 0) & (w2 > 0) & (h2 > 0))
+
+    def __collide(self,running):
+        '''Applies sword and fireball damage, like the collision block of Match.step'''
+        health = self.health.copy()
+
+        # Sword attacks, reduced if the other player is defending
+        touching = self.__overlap(self.x[:,0],self.y[:,0],self.w[:,0],self.h[:,0],
+                                  self.x[:,1],self.y[:,1],self.w[:,1],self.h[:,1])[:,None]
+        attacker = self.damaging[:,::-1]
+        sword = numpy.where(self.defending,self.blockDamage,self.damage)
+        self.health -= numpy.where(touching & attacker,sword,0)
+
+        # Fireballs only hurt the other player, and only if not defending
+        hit = self.projAlive[:,::-1] & self.__overlap(self.x,self.y,self.w,self.h,
+                                                      self.projX[:,::-1],self.projY[:,::-1],
+                                                      self.projW[:,::-1],self.projH[:,::-1])
+        self.health -= numpy.where(hit & ~self.defending,self.fireballDamage,0)
+
+        # Damage each player dealt, while the match is still being decided
+        self.damageDealt += numpy.where(running[:,None],health - self.health,0)[:,::-1]
+
+    def __anim(self,mask,animation):
+        '''Changes the image of the players in mask, like Player.anim'''
+        if not mask.any():
+            return
+        number, delay = TIMING[animation]
+        centreX = self.x + self.w // 2
+        bottom = self.y + self.h
+
+        # Resets the counter if showing a new animation, then counts
+        count = numpy.where(self.animation != animation,0,self.count)
+        count = numpy.where(count >= number - 1,0,count + 1)
+        self.count = numpy.where(mask,count,self.count)
+        frame = self.count // delay if delay != -1 else self.count
+        frame = numpy.clip(frame,0,self.__playerW.shape[2] - 1)
+
+        # Gets the new rect, and keeps the player's centre and bottom
+        w = self.__playerW[self.__column,animation,frame]
+        h = self.__playerH[self.__column,animation,frame]
+        self.x = numpy.where(mask,centreX - w // 2,self.x)
+        self.y = numpy.where(mask,bottom - h,self.y)
+        self.w = numpy.where(mask,w,self.w)
+        self.h = numpy.where(mask,h,self.h)
+        self.animation[mask] = animation
+
+    def __platformTop(self):
+        '''Returns the top of the highest platform each player overlaps, or -1'''
+        tile = self.__tile
+        rows, columns = self.__solid.shape[0], self.__solid.shape[1] - 1
+        top = numpy.full(self.x.shape,-1,numpy.int64)
+        left = numpy.clip(self.x // tile,0,columns)
+        right = numpy.clip((self.x + self.w - 1) // tile + 1,0,columns)
+        first = -((-self.y) // tile)
+
+        # Platforms are 1 pixel tall at the top of a row, so only rows whose
+        # top is inside the player's rect can be touched
+        for offset in range(int(self.h.max()) // tile + 2):
+            row = first + offset
+            inside = (row * tile < self.y + self.h) & (row >= 0) & (row < rows) & (top == -1)
+            safeRow = numpy.clip(row,0,rows - 1)
+            solid = self.__solid[safeRow,right] - self.__solid[safeRow,left] > 0
+            top = numpy.where(inside & solid & (self.w > 0) & (self.h > 0),row * tile,top)
+        return top
+
+    def __updatePlayers(self):
+        '''Moves and animates every player, like Player.update'''
+        # Adds gravity to the player
+        self.changeY += self.gravity
+
+        # Stops gravity if player collides with platform and going down
+        top = self.__platformTop()
+        land = (top != -1) & (self.changeY >= 0)
+        self.y = numpy.where(land,top - self.h,self.y)
+        self.air[land] = False
+        self.changeY[land] = 0
+
+        # Moves the player
+        self.x += self.changeX
+        self.y = roundRect(self.y + self.changeY)
+
+        # Stops the player at the sides of the screen
+        wall = (self.x <= 0) & (self.changeX < 0)
+        self.x[wall] = 0
+        wall2 = (self.x + self.w >= self.width) & (self.changeX > 0)
+        self.x = numpy.where(wall2,self.width - self.w,self.x)
+        self.changeX[wall | wall2] = 0
+        self.state[wall | wall2] = MOVEMENT
+
+        # Dying animation, which stops after 100 frames
+        self.changeX[self.dead] = 0
+        self.__anim(self.dead & (self.count < 99),DYING)
+        alive = ~self.dead
+
+        # Attacking, only on the ground
+        attack = alive & (self.state == ATTACK)
+        self.defending[attack] = False
+        ground = attack & ~self.air
+        self.__anim(ground,ATTACKING)
+        self.changeX[ground] = 0
+        hit = ground & (self.count >= 12) & (self.count % 4 >= 3)
+        self.damaging[ground] = hit[ground]
+        self.sound[ground] = hit[ground]
+        self.changeX = numpy.where(hit,numpy.where(self.facing == LEFT,-self.lunge,self.lunge),self.changeX)
+        air = attack & self.air
+        self.damaging[air] = False
+        self.state[air] = MOVEMENT
+        self.changeX[air] = 0
+
+        # Defending, only on the ground and standing still
+        defend = alive & (self.state == DEFEND)
+        self.damaging[defend] = False
+        block = defend & ~self.air & (self.changeX == 0)
+        self.defending[block] = True
+        self.__anim(block,DEFENDING)
+        self.sound[block & (self.count % 2 == 0)] = True
+        cancel = defend & ~block
+        self.sound[cancel] = False
+        self.state[cancel] = MOVEMENT
+        self.changeX[cancel] = 0
+        self.defending[cancel] = False
+
+        # Crouching, only on the ground and standing still
+        crouch = alive & (self.state == CROUCH)
+        self.damaging[crouch] = False
+        self.defending[crouch] = False
+        down = crouch & ~self.air & (self.changeX == 0)
+        self.__anim(down,CROUCHING)
+        cancel = crouch & ~down
+        self.state[cancel] = MOVEMENT
+        self.changeX[cancel] = 0
+
+        # Moving, standing or jumping
+        movement = alive & (self.state == MOVEMENT)
+        self.damaging[movement] = False
+        self.defending[movement] = False
+        self.__anim(movement & ~self.air & (self.changeX == 0),IDLE)
+        self.__anim(movement & ~self.air & (self.changeX != 0),SPRINT)
+        self.__anim(movement & self.air,JUMPING)
+
+    def __updateHealth(self):
+        '''Marks empty health bars as dead, like HealthBar.update'''
+        empty = ~self.healthDead & (self.health < 1)
+        self.healthDead |= empty
+        self.health[empty] = 0
+
+    def __updateProjectiles(self):
+        '''Moves and animates every fireball, like Projectile.update'''
+        alive = self.projAlive
+        if not alive.any():
+            return
+        self.projSpeed = numpy.where(alive,self.projSpeed + self.acceleration,self.projSpeed)
+        resetX = numpy.where(self.projFacing == LEFT,self.projX,self.projX + self.projW)
+
+        # Once the fireball runs through all 5 images, goes back to the 4th
+        count = self.projCount + 1
+        count = numpy.where(count >= 50,30,count)
+        self.projCount = numpy.where(alive,count,self.projCount)
+        frame = self.projCount // 10
+        w = self.__projW[self.__column,frame]
+        h = self.__projH[self.__column,frame]
+
+        # Keeps the leading edge and moves it in the fireball's direction
+        x = numpy.where(self.projFacing == LEFT,roundRect(resetX - self.projSpeed),roundRect(resetX - w + self.projSpeed))
+        self.projX = numpy.where(alive,x,self.projX)
+        self.projY = numpy.where(alive,self.projCentreY - h // 2,self.projY)
+        self.projW = numpy.where(alive,w,self.projW)
+        self.projH = numpy.where(alive,h,self.projH)
+
+        # Removes fireballs that leave the screen
+        gone = alive & ((self.projX + self.projW >= self.width) | (self.projX <= 0))
+        self.projAlive &= ~gone
+
+def main():
+    '''Times a batch of matches with random inputs'''
+    import sys, time
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    random = numpy.random.RandomState(0)
+    batch = BatchSim(matches)
+    start = time.time()
+    bits1 = bits2 = None
+    while not batch.over() and batch.frames.max() < 3600:
+        # Holds random inputs for a few frames at a time, like a player would
+        if batch.frames.max() % 10 == 0:
+            bits1 = random.randint(0,128,matches)
+            bits2 = random.randint(0,128,matches)
+        batch.step(bits1,bits2)
+    seconds = time.time() - start
+    steps = int(batch.frames.max())
+    print(str(matches) + " matches, " + str(steps) + " steps in " + str(round(seconds,2)) + "s, " +
+          str(int(matches * steps / seconds)) + " match frames per second")
+    print("player 1 wins: " + str(int((batch.winner == 1).sum())) + ", player 2 wins: " +
+          str(int((batch.winner == 2).sum())) + ", draws: " + str(int((batch.winner == 0).sum())) +
+          ", unfinished: " + str(int((batch.winner == -1).sum())))
+
+if __name__ == "__main__":
+    main()
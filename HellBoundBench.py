@@ -0,0 +1,238 @@
+""" Author: Anson Tran
+
+    Description: Times HellBound's scenes frame by frame, under SDL's dummy
+                 video and audio drivers so no window or sound card is needed.
+                 Each scenario runs the real scene functions from HellBound.py
+                 as fast as they can go, and reports frame time percentiles
+                 and frames per second. The duel scenarios are driven by
+                 replays recorded from bots, so every run plays the same match.
+                 Cold starts are timed in new processes, from launch to the
+                 first frame and to the intro's first frame.
+
+                 Example:
+                     python HellBoundBench.py --out bench.json
+                     python HellBoundBench.py --compare bench.json
+"""
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER","dummy")
+os.environ.setdefault("SDL_AUDIODRIVER","dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+
+import sys, json, time, random, argparse, tempfile, subprocess, pygame
+import HellBound, HellBoundSim, HellBoundReplay, HellBoundBots, HellBoundAssets
+
+# Scenarios, in the order they are run
+SCENARIOS = ("menu","duel","fireballs","barrage","stress","contact")
+
+# Run with "python -c" to time a cold start. Prints when the first frame and
+# the intro's first frame were shown, then quits.
+STARTUP = """
+import os, sys, time, json, pygame
+shown = []
+def timed(function):
+    def frame(*arguments):
+        result = function(*arguments)
+        shown.append(time.time())
+        if pygame.display.get_caption()[0] == "Welcome!":
+            print(json.dumps([shown[0],shown[-1]]))
+            sys.stdout.flush()
+            os._exit(0)
+        return result
+    return frame
+pygame.display.flip = timed(pygame.display.flip)
+pygame.display.update = timed(pygame.display.update)
+import HellBound
+HellBound.main(sys.argv[1:])
+"""
+
+class FrameTimer(object):
+    '''This class times each frame by the moment it is pushed to the display,
+    and asks the scene to quit after a number of frames'''
+    def __init__(self,frames):
+        '''The initializer takes the number of frames to time'''
+        self.__frames = frames
+        self.__last = None
+        self.times = []   # Seconds taken by each frame
+
+    def __enter__(self):
+        '''Wraps the display functions every scene uses to show a frame'''
+        self.__flip = pygame.display.flip
+        self.__update = pygame.display.update
+        pygame.display.flip = self.__wrap(self.__flip)
+        pygame.display.update = self.__wrap(self.__update)
+        return self
+
+    def __exit__(self,*error):
+        '''Puts the display functions back'''
+        pygame.display.flip = self.__flip
+        pygame.display.update = self.__update
+
+    def __wrap(self,function):
+        '''Returns function, timed as the end of a frame'''
+        def timed(*arguments):
+            result = function(*arguments)
+            now = time.perf_counter()
+            if self.__last is not None:
+                self.times.append(now - self.__last)
+            self.__last = now
+            # Quits the scene once enough frames are timed
+            if len(self.times) == self.__frames:
+                pygame.event.post(pygame.event.Event(pygame.QUIT))
+            return result
+        return timed
+
+def recordBots(path,level,bot1,bot2,frames,seed=0):
+    '''Plays a headless match between two bots and records it as a replay'''
+    rng = random.Random(seed)
+    match = HellBoundSim.Match(level)
+    player1 = HellBoundBots.BOTS[bot1](rng)
+    player2 = HellBoundBots.BOTS[bot2](rng)
+    recorder = HellBoundReplay.Recorder(path,level,seed)
+    while recorder.frames() < frames:
+        bits1 = player1.act(match,match.player1,match.player2)
+        bits2 = player2.act(match,match.player2,match.player1)
+        recorder.record(bits1,bits2)
+        match.step(bits1,bits2)
+    recorder.close()
+
+def recordBits(path,level,bits1,bits2,frames,rules=None):
+    '''Records a replay where each player holds the same input every frame,
+    played with the rules given, or the default ones'''
+    recorder = HellBoundReplay.Recorder(path,level,rules=rules)
+    for frame in range(frames):
+        recorder.record(bits1,bits2)
+    recorder.close()
+
+def stressLevel(path,rows=17,columns=30):
+    '''Writes a level where every other cell of every row is a platform. No
+    two cells touch, so none are merged into spans: the defaults make 255
+    separate platforms, filling the arena.'''
+    level = open(path,"w")
+    for row in range(rows):
+        level.write("".join("1" if column % 2 == 0 else " " for column in range(columns)) + "\n")
+    level.close()
+
+def runScene(frames,state,level="level.txt",replay=None):
+    '''Runs HellBound's main() from a scene, as fast as possible, and returns the frame times'''
+    HellBound.STATE = state
+    HellBound.FPS = 0
+    HellBound.LEVEL = level
+    HellBound.REPLAY = replay
+    HellBound.FAST = True
+    HellBound.RECORD = None
+    # The loading screen's frames would be timed along with the scene's
+    HellBound.PRELOAD = False
+    with FrameTimer(frames) as timer:
+        HellBound.main()
+        
+    # main() quits pygame, which leaves cached fonts and sounds unusable
+    HellBoundAssets.cache.clear()
+    return timer.times[:frames]
+
+def scenario(name,frames,folder):
+    '''Runs a named scenario and returns its frame times'''
+    replay = os.path.join(folder,name + ".hbr")
+    if name == "menu":
+        return runScene(frames,"intro")
+    if name == "duel":
+        recordBots(replay,"level.txt","rusher","zoner",frames)
+        return runScene(frames,"play","level.txt",replay)
+    if name == "fireballs":
+        recordBits(replay,"level.txt",HellBoundSim.FIREBALL,HellBoundSim.FIREBALL,frames)
+        return runScene(frames,"play","level.txt",replay)
+    if name == "barrage":
+        # The replay holds the barrage rules it is played with
+        recordBits(replay,"level.txt",HellBoundSim.FIREBALL,HellBoundSim.FIREBALL,frames,HellBoundSim.BARRAGE + (HellBoundSim.CLASHES,))
+        return runScene(frames,"play","level.txt",replay)
+    if name == "stress":
+        level = os.path.join(folder,"stress.txt")
+        stressLevel(level)
+        recordBots(replay,level,"random","random",frames)
+        return runScene(frames,"play",level,replay)
+    if name == "contact":
+        # Two rushers meet and trade sword attacks up close
+        recordBots(replay,"level.txt","rusher","rusher",frames)
+        return runScene(frames,"play","level.txt",replay)
+    raise ValueError("unknown scenario " + name)
+
+def startup(runs,arguments=()):
+    '''Launches HellBound in a new process for each run, and returns lists of
+    the seconds each took to show its first frame, and the intro's first frame'''
+    first = []
+    intro = []
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for run in range(runs):
+        start = time.time()
+        output = subprocess.check_output([sys.executable,"-c",STARTUP] + list(arguments),cwd=folder)
+        shown, ready = json.loads(output.decode().strip().splitlines()[-1])
+        first.append(shown - start)
+        intro.append(ready - start)
+    return first, intro
+
+def percentile(values,fraction):
+    '''Returns a percentile of a sorted list, by the nearest rank'''
+    if not values:
+        return 0.0
+    index = min(len(values) - 1,max(0,int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+def summary(times):
+    '''Returns frame time percentiles in milliseconds, and frames per second'''
+    ordered = sorted(times)
+    total = sum(times)
+    return {"frames": len(times),
+            "p50": round(percentile(ordered,0.50) * 1000,3),
+            "p95": round(percentile(ordered,0.95) * 1000,3),
+            "p99": round(percentile(ordered,0.99) * 1000,3),
+            "max": round(ordered[-1] * 1000,3) if ordered else 0.0,
+            "fps": round(len(times) / total,1) if total else 0.0}
+
+def main(arguments=None):
+    '''Runs the benchmark from the command line'''
+    parser = argparse.ArgumentParser(description="Time HellBound's scenes frame by frame.")
+    parser.add_argument("--frames",type=int,default=600,help="frames to time in each scenario")
+    parser.add_argument("--scenarios",nargs="+",default=list(SCENARIOS),choices=SCENARIOS,help="scenarios to run")
+    parser.add_argument("--dirty",action="store_true",help="use the dirty rectangle renderer")
+    parser.add_argument("--startup",type=int,default=5,help="cold starts to time, 0 to skip")
+    parser.add_argument("--out",help="file to save the results to, as JSON")
+    parser.add_argument("--compare",help="results of an earlier run to compare against")
+    options = parser.parse_args(arguments)
+
+    HellBound.DIRTY = options.dirty
+    results = {}
+    # The replays and levels the scenarios write are deleted once they have run
+    with tempfile.TemporaryDirectory(prefix="hellbound-bench-") as folder:
+        for name in options.scenarios:
+            results[name] = summary(scenario(name,options.frames,folder))
+            print(name.ljust(10) + " p50 " + str(results[name]["p50"]).rjust(7) + "ms  p95 " +
+                  str(results[name]["p95"]).rjust(7) + "ms  p99 " + str(results[name]["p99"]).rjust(7) +
+                  "ms  " + str(results[name]["fps"]).rjust(8) + " fps  " + str(results[name]["frames"]) + " frames")
+
+    # Startup is compared by the median time to the intro
+    if options.startup:
+        first, intro = startup(options.startup,["--dirty"] if options.dirty else [])
+        results["startup"] = {"runs": options.startup,
+                              "first": round(percentile(sorted(first),0.5) * 1000,1),
+                              "p50": round(percentile(sorted(intro),0.5) * 1000,1),
+                              "max": round(max(intro) * 1000,1)}
+        print("startup".ljust(10) + " first frame " + str(results["startup"]["first"]) + "ms  intro " +
+              str(results["startup"]["p50"]) + "ms  max " + str(results["startup"]["max"]) + "ms  " +
+              str(options.startup) + " runs")
+
+    if options.compare:
+        # Positive changes mean the frames got slower
+        old = json.load(open(options.compare,"r"))["scenarios"]
+        for name in results:
+            if name in old and old[name]["p50"]:
+                change = (results[name]["p50"] - old[name]["p50"]) / old[name]["p50"] * 100
+                print(name.ljust(10) + " p50 change " + ("%+.1f" % change) + "%")
+
+    if options.out:
+        output = open(options.out,"w")
+        json.dump({"frames": options.frames,"dirty": options.dirty,"scenarios": results},output,indent=2)
+        output.close()
+    return results
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
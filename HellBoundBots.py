@@ -0,0 +1,97 @@
+""" Author: Anson Tran
+
+    Description: Bots that play HellBound by choosing input bits every frame,
+                 like a player pressing keys. They fill the seats of a
+                 free-for-all without a player, and play each other in
+                 HellBoundTournament, HellBoundNet's self-check and the
+                 benchmarks.
+"""
+
+import HellBoundSim
+
+# Distance at which bots consider the enemy close enough to hit
+REACH = 60
+
+class Bot(object):
+    '''This class defines a bot that does nothing. Other bots override act().'''
+    def __init__(self,rng):
+        '''The initializer takes the random number generator the bot may use'''
+        self.rng = rng
+
+    def act(self,match,me,enemy):
+        '''Returns the input bits for this frame, given the match and both players'''
+        return 0
+
+    def towards(self,me,enemy):
+        '''Returns the bit that moves me towards the enemy'''
+        if enemy.rect.centerx < me.rect.centerx:
+            return HellBoundSim.LEFT
+        return HellBoundSim.RIGHT
+
+    def away(self,me,enemy):
+        '''Returns the bit that moves me away from the enemy'''
+        if enemy.rect.centerx < me.rect.centerx:
+            return HellBoundSim.RIGHT
+        return HellBoundSim.LEFT
+
+    def distance(self,me,enemy):
+        '''Returns the horizontal distance between the players'''
+        return abs(enemy.rect.centerx - me.rect.centerx)
+
+class RandomBot(Bot):
+    '''Presses random buttons, holding them for a few frames like a person would'''
+    def __init__(self,rng):
+        '''The initializer takes the random number generator, and starts holding nothing'''
+        Bot.__init__(self,rng)
+        self.__bits = 0
+        self.__hold = 0
+
+    def act(self,match,me,enemy):
+        '''Returns the bits being held, picking new ones once they have been held long enough'''
+        if self.__hold == 0:
+            self.__bits = self.rng.randrange(128)
+            self.__hold = self.rng.randint(5,20)
+        self.__hold -= 1
+        return self.__bits
+
+class RusherBot(Bot):
+    '''Runs at the enemy, jumps onto their platform, and attacks up close'''
+    def act(self,match,me,enemy):
+        '''Returns the bits that close in on the enemy, or attack once in reach'''
+        if self.distance(me,enemy) > REACH:
+            bits = self.towards(me,enemy)
+            # Jumps if the enemy is standing higher up
+            if enemy.rect.bottom < me.rect.bottom - 20:
+                bits |= HellBoundSim.JUMP
+            return bits
+        return HellBoundSim.ATTACK
+
+class TurtleBot(Bot):
+    '''Blocks when the enemy is close, and attacks back now and then'''
+    def act(self,match,me,enemy):
+        '''Returns the bits that walk up to the enemy, then mostly block'''
+        if self.distance(me,enemy) > REACH * 3:
+            return self.towards(me,enemy)
+        if self.rng.random() < 0.2:
+            return HellBoundSim.ATTACK
+        return HellBoundSim.DEFEND
+
+class ZonerBot(Bot):
+    '''Keeps its distance and throws fireballs'''
+    def __init__(self,rng):
+        '''The initializer takes the random number generator, and starts ready to turn'''
+        Bot.__init__(self,rng)
+        self.__turn = False
+
+    def act(self,match,me,enemy):
+        '''Returns the bits that back away from a close enemy, or turn and fire'''
+        if self.distance(me,enemy) < REACH * 2:
+            return self.away(me,enemy) | HellBoundSim.JUMP
+        # Turns to face the enemy, then fires on the next frame
+        self.__turn = not self.__turn
+        if self.__turn:
+            return self.towards(me,enemy)
+        return HellBoundSim.FIREBALL
+
+# Every bot, by name
+BOTS = {"idle": Bot, "random": RandomBot, "rusher": RusherBot, "turtle": TurtleBot, "zoner": ZonerBot}
@@ -0,0 +1,98 @@
+""" Author: Anson Tran
+
+    Description: The HUD drawn over a match: the healthbars, and overlays such
+                 as the round timer. Each widget reads its value every frame,
+                 and only draws itself again when the value has changed, so a
+                 HUD that is not changing costs one comparison per widget.
+                 Bars are drawn once at full width, and shown clipped to
+                 their value, so a changing bar copies no pixels at all.
+"""
+
+import pygame, HellBoundAssets
+
+# Font of the text widgets
+FONT = "rez/ARCADECLASSIC.TTF"
+
+class Widget(pygame.sprite.Sprite):
+    '''This class is the base of the HUD's sprites. It draws a value, read by
+    calling a function, whenever the value changes.'''
+    def __init__(self,value):
+        '''The initializer takes the function returning the value shown'''
+        pygame.sprite.Sprite.__init__(self)
+        self.__value = value
+        self.redraws = 0   # Number of times the widget was drawn
+
+        # Draws the first value straight away, so the widget has an image
+        self.__shown = value()
+        self.draw(self.__shown)
+
+    def update(self):
+        '''Draws the widget again, only if its value changed'''
+        value = self.__value()
+        if value != self.__shown:
+            self.__shown = value
+            self.draw(value)
+            self.redraws += 1
+
+    def draw(self,value):
+        '''Sets the image and rect to show a value. Every widget must override
+        it, so a widget that does not fails as soon as it is made, as the
+        first value is drawn by __init__.'''
+        raise NotImplementedError(type(self).__name__ + " must override Widget.draw()")
+
+class Bar(Widget):
+    '''This class defines a bar as long as its value, eg. a player's health'''
+    def __init__(self,value,x,y,align,width=200,height=10,color=(255,0,0)):
+        '''The initializer takes the function returning the value, the x,y of
+        the edge the bar grows from, the side it is aligned to, the size of
+        a full bar and its colour'''
+        self.__x = x
+        self.__y = y
+        self.__align = align
+        self.__width = width
+
+        # The full bar is drawn once. Each length is a subsurface of it, made
+        # the first time the length is shown and kept, as it shares the pixels.
+        self.__full = HellBoundAssets.displayFormat(pygame.Surface((width,height)),False)
+        self.__full.fill(color)
+        self.__clipped = [None] * (width + 1)
+        Widget.__init__(self,value)
+
+    def draw(self,value):
+        '''Shows the full bar clipped to the value'''
+        length = min(max(int(value),0),self.__width)
+        if self.__clipped[length] is None:
+            # A bar aligned right keeps the right end of the full bar
+            left = self.__width - length if self.__align == "right" else 0
+            self.__clipped[length] = self.__full.subsurface((left,0,length,self.__full.get_height()))
+        self.image = self.__clipped[length]
+        self.rect = self.image.get_rect()
+        if self.__align == "right":
+            self.rect.right = self.__x
+        if self.__align == "left":
+            self.rect.left = self.__x
+        self.rect.top = self.__y
+
+class Text(Widget):
+    '''This class defines text showing a value, eg. the round timer'''
+    def __init__(self,value,x,y,size,align="center",color=(255,255,255)):
+        '''The initializer takes the function returning the value, the x,y,
+        the text size, the alignment and the colour'''
+        self.__x = x
+        self.__y = y
+        self.__size = size
+        self.__align = align
+        self.__color = color
+        Widget.__init__(self,value)
+
+    def draw(self,value):
+        '''Shows the value as text, put together from cached runs of text'''
+        self.image = HellBoundAssets.compose(FONT,self.__size,str(value),self.__color)
+        self.rect = self.image.get_rect()
+        if self.__align == "center":
+            self.rect.centerx = self.__x
+        if self.__align == "left":
+            self.rect.left = self.__x
+        if self.__align == "right":
+            self.rect.right = self.__x
+        self.rect.top = self.__y
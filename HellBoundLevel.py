@@ -0,0 +1,148 @@
+""" Author: Anson Tran
+
+    Description: Loads a level from a text file, where every "1" is a platform
+                 on a 30 pixel grid. Runs of platforms next to each other on
+                 a row are merged into one wide platform, so a full floor is
+                 one rect instead of one per cell. The merged spans are saved
+                 in a small binary file next to the level, and reused until
+                 the text file changes.
+
+                 The platforms are indexed by grid cell, so finding the
+                 platforms a rect touches only looks at the cells under the
+                 rect, no matter how big the level is.
+"""
+
+import os, struct, hashlib, HellBoundSprites
+
+# Size of a grid cell in pixels
+TILE = 30
+
+# Compiled level format: a header followed by one (column, row, length) per span
+MAGIC = b"HBLV"
+VERSION = 1
+HEADER = struct.Struct("<4sHdI20sI") # magic, version, mtime, size, sha1, span count
+SPAN = struct.Struct("<HHH")         # column, row, length
+
+def compiledPath(path):
+    '''Returns the path of the compiled form of a level, eg. level.txt -> level.lvl'''
+    return os.path.splitext(path)[0] + ".lvl"
+
+def digest(path):
+    '''Returns the SHA-1 of a level's text file, which identifies the level'''
+    source = open(path,"rb")
+    value = hashlib.sha1(source.read()).digest()
+    source.close()
+    return value
+
+def parse(source):
+    '''Takes the text of a level and returns a list of (column, row, length)
+    spans, with contiguous "1"s on a row merged into one span'''
+    spans = []
+    for row, text in enumerate(source.splitlines()):
+        column = 0
+        while column < len(text):
+            if text[column] == "1":
+                # Grows the span until the run of platforms ends
+                start = column
+                while column < len(text) and text[column] == "1":
+                    column += 1
+                spans.append((start,row,column - start))
+            else:
+                column += 1
+    return spans
+
+def spans(path):
+    '''Returns the merged spans of a level, from its compiled form if the
+    text file has not changed, otherwise by compiling it again'''
+    stat = os.stat(path)
+    header = None
+    data = b""
+
+    # Reads the compiled level, if there is one
+    try:
+        compiled = open(compiledPath(path),"rb")
+        data = compiled.read()
+        compiled.close()
+        if len(data) >= HEADER.size:
+            header = HEADER.unpack_from(data)
+    except IOError:
+        pass
+
+    if header is not None and header[0] == MAGIC and header[1] == VERSION:
+        count = header[5]
+        if len(data) == HEADER.size + count * SPAN.size:
+            # Same modified time and size, so the compiled level is still good
+            fresh = header[2] == stat.st_mtime and header[3] == stat.st_size
+            source = None
+
+            # Otherwise, compares the contents, eg. after a checkout touched the file
+            if not fresh:
+                source = open(path,"rb").read()
+                fresh = hashlib.sha1(source).digest() == header[4]
+
+            if fresh:
+                compiled = [SPAN.unpack_from(data,HEADER.size + index * SPAN.size) for index in range(count)]
+                # Stores the new modified time, so the next load skips the hash
+                if source is not None:
+                    save(path,source,compiled,stat)
+                return compiled
+
+    source = open(path,"rb").read()
+    compiled = parse(source.decode("ascii","replace"))
+    save(path,source,compiled,stat)
+    return compiled
+
+def save(path,source,compiled,stat):
+    '''Writes the compiled form of a level, given its source and os.stat'''
+    data = [HEADER.pack(MAGIC,VERSION,stat.st_mtime,stat.st_size,hashlib.sha1(source).digest(),len(compiled))]
+    for span in compiled:
+        data.append(SPAN.pack(*span))
+
+    # Ignores read-only folders, the level is compiled again next time
+    try:
+        output = open(compiledPath(path),"wb")
+        output.write(b"".join(data))
+        output.close()
+    except IOError:
+        pass
+
+class Level(object):
+    '''This class defines a level and its grid of platforms'''
+    def __init__(self,path="level.txt"):
+        '''The initializer takes the path of the level's text file'''
+        self.__path = path
+        self.__cells = {}     # (column, row) -> platform sprite covering that cell
+        self.__platforms = [] # Platforms, top row first, then left to right
+
+        # One platform sprite per span, registered in every cell it covers
+        for column, row, length in spans(path):
+            platform = HellBoundSprites.Platform(column * TILE,row * TILE,length)
+            self.__platforms.append(platform)
+            for cell in range(column,column + length):
+                self.__cells[(cell,row)] = platform
+
+    def path(self):
+        '''Returns the path of the level's text file'''
+        return self.__path
+
+    def sprites(self):
+        '''Returns a list of every platform sprite'''
+        return list(self.__platforms)
+
+    def collide(self,rect):
+        '''Returns the platforms that overlap a rect, top row first, then left to right'''
+        found = []
+        if rect.width <= 0 or rect.height <= 0:
+            return found
+
+        # Only checks the cells underneath the rect
+        for row in range(rect.top // TILE,(rect.bottom - 1) // TILE + 1):
+            last = None
+            for column in range(rect.left // TILE,(rect.right - 1) // TILE + 1):
+                platform = self.__cells.get((column,row))
+                # A span covers several cells in a row, but is only tested once
+                if platform is not None and platform is not last:
+                    last = platform
+                    if rect.colliderect(platform.rect):
+                        found.append(platform)
+        return found
@@ -0,0 +1,356 @@
+""" Author: Anson Tran
+
+    Description: Online 1v1 over UDP, with rollback. Each peer runs the whole
+                 match and only sends its own input bits, one byte a frame.
+                 The remote player's input is guessed by repeating the last
+                 input received, so local input is applied straight away.
+                 When the real input arrives and differs from the guess, the
+                 match is restored to that frame and simulated forward again.
+                 Every packet repeats the inputs the peer has not received
+                 yet, so a lost packet is covered by the next one. Once the
+                 match is over, each peer stops and tells the other the
+                 frame it ended on. A peer that played past that frame goes
+                 back to it, so both end on the same frame with the same
+                 match. Every packet also holds the rules the match is
+                 played with, and a peer playing with other rules is
+                 ignored, as the two matches would not stay the same.
+
+                 A delay and a loss rate can be added to the packets sent,
+                 to try it out over loopback. Run "python HellBoundNet.py"
+                 to play a match between two bots over loopback, to the end,
+                 and check both peers end up with the same match, eg.
+                     python HellBoundNet.py --delay 100 --loss 0.2
+"""
+
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+
+import sys, time, random, socket, struct, argparse, HellBoundSim, HellBoundBots
+
+# Packet format: a header and the rules, followed by one byte of input bits per frame
+MAGIC = b"HBNT"
+VERSION = 2
+HEADER = struct.Struct("<4sHIIIB") # magic, version, frame of the first input, frames received, frames played before the match ended (0 while playing), inputs
+RULES = struct.Struct("<BB?")      # fireballs, cooldown, clashes
+
+# Most inputs sent in one packet
+BURST = 255
+
+# Frames the local player may get ahead of the remote input received
+WINDOW = 8
+
+# Seconds without a packet before the peer is taken to have left
+TIMEOUT = 3.0
+
+def address(text):
+    '''Turns "host:port" into a (host, port) tuple, the host defaults to loopback'''
+    host, port = text.rsplit(":",1)
+    return (host or "127.0.0.1",int(port))
+
+class Session(object):
+    '''This class plays a match against a peer on another machine, or another window'''
+    def __init__(self,match,side,port,peer,delay=0.0,loss=0.0,window=WINDOW,seed=None):
+        '''The initializer takes the match, the local player (1 or 2), the
+        UDP port to listen on, the peer's (host, port), the seconds every
+        packet sent is held back, the fraction of packets dropped, and how
+        many frames the local player may get ahead of the remote input'''
+        self.__match = match
+        self.__side = side
+        self.__peer = peer
+        self.__delay = delay
+        self.__loss = loss
+        self.__window = window
+        self.__random = random.Random(seed)
+
+        self.__socket = socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+        self.__socket.bind(("",port))
+        self.__socket.setblocking(False)
+
+        self.__outbox = []      # (time to send, packet) held back by the delay
+        self.__local = []       # Local input bits of every frame
+        self.__remote = []      # Remote input bits received, in frame order
+        self.__acked = 0        # Frames of local input the peer has received
+        self.__guesses = {}     # Frame -> remote bits the frame was simulated with
+        self.__history = HellBoundSim.History(match,window + 1) # States of the frames guessed
+        self.__heard = None     # Time the last packet arrived
+        self.__ended = None     # Frame the match ended on here, once over with the real input
+        self.__peerEnded = None # Frame the match ended on for the peer
+        self.__rules = match.rules()
+        self.__conflict = False # Whether the peer plays with other rules
+
+        self.rollbacks = 0      # Number of times the match was rolled back
+        self.resimulated = 0    # Frames simulated again after a rollback
+        self.stalls = 0         # Steps spent waiting for the remote input
+
+    def step(self,bits):
+        '''Simulates the next frame with the local player's bits, and returns
+        the sounds it played. Returns None instead if the local player is too
+        far ahead of the remote input, and the frame has to wait.'''
+        self.poll()
+        frame = self.__match.frame()
+        if frame - len(self.__remote) >= self.__window:
+            self.stalls += 1
+            self.__send()
+            return None
+        self.__local.append(bits)
+        sounds = self.__simulate(frame)
+        self.__send()
+        return sounds
+
+    def idle(self):
+        '''Keeps the connection going without simulating a frame, eg. while
+        waiting for the peer's input'''
+        self.poll()
+        if self.__acked < len(self.__local):
+            self.__send()
+
+    def poll(self):
+        '''Sends the packets whose delay has passed, reads the packets that
+        arrived, and rolls the match back if a guess was wrong'''
+        now = time.perf_counter()
+        while self.__outbox and self.__outbox[0][0] <= now:
+            self.__transmit(self.__outbox.pop(0)[1])
+
+        received = len(self.__remote)
+        while True:
+            try:
+                data = self.__socket.recv(HEADER.size + RULES.size + BURST)
+            except BlockingIOError:
+                break
+            except OSError:
+                # Eg. the peer's port was closed, reported on Windows
+                continue
+            self.__receive(data)
+            self.__heard = now
+
+        # Finds the first frame simulated with a wrong guess
+        for frame in range(received,min(len(self.__remote),self.__match.frame())):
+            if self.__guesses[frame] != self.__remote[frame]:
+                self.__rollback(frame)
+                break
+
+        # Frames whose remote input is known can never be rolled back
+        for frame in range(received,len(self.__remote)):
+            self.__guesses.pop(frame,None)
+
+        # Goes back to the frame the peer ended the match on, if this side
+        # played past it before seeing the match was over
+        ended = self.__peerEnded
+        if ended is not None and self.__match.frame() > ended and len(self.__remote) >= ended and ended in self.__history:
+            self.__history.restore(ended)
+            del self.__local[ended:]
+            self.__guesses = {}
+
+    def finish(self):
+        '''Call every frame once the match is over, instead of step(). Nothing
+        is simulated, but rollbacks still happen. Once every frame played
+        used the remote player's real input, the peer is told the frame the
+        match ended on. Returns True once both peers ended on the same frame,
+        and the session can be closed.'''
+        self.poll()
+        if self.__ended is None and self.settled() and self.__match.over():
+            self.__ended = self.__match.frame()
+        self.__send()
+        return self.__ended is not None and self.__ended == self.__peerEnded
+
+    def settled(self):
+        '''Tells us whether every frame simulated used the remote player's real input'''
+        return len(self.__remote) >= self.__match.frame()
+
+    def conflict(self):
+        '''Tells us whether the peer plays the match with other rules, eg. only
+        one was started with --barrage or --clash. Its packets are then ignored.'''
+        return self.__conflict
+
+    def lost(self):
+        '''Tells us whether the peer has stopped sending packets'''
+        return self.__heard is not None and time.perf_counter() - self.__heard > TIMEOUT
+
+    def inputs(self):
+        '''Returns lists of player 1's and player 2's input bits for the frames
+        whose input is known on both sides'''
+        frames = min(len(self.__local),len(self.__remote))
+        if self.__side == 1:
+            return self.__local[:frames], self.__remote[:frames]
+        return self.__remote[:frames], self.__local[:frames]
+
+    def close(self):
+        '''Sends the local input a last few times, and closes the socket'''
+        for attempt in range(3):
+            self.__transmit(self.__packet())
+        self.__socket.close()
+
+    def __simulate(self,frame):
+        '''Simulates a frame with the local bits and the remote bits, or a
+        guess of them, and returns its sounds. The state before every frame
+        is saved, so a frame simulated again after a rollback replaces the
+        state saved with the wrong guess.'''
+        self.__history.save()
+        if frame < len(self.__remote):
+            remote = self.__remote[frame]
+        else:
+            # Guesses the remote player is still pressing what they last pressed
+            remote = self.__remote[-1] if self.__remote else 0
+            self.__guesses[frame] = remote
+        if self.__side == 1:
+            return self.__match.step(self.__local[frame],remote)
+        return self.__match.step(remote,self.__local[frame])
+
+    def __rollback(self,frame):
+        '''Restores the match to before a frame, and simulates up to the present again'''
+        present = self.__match.frame()
+        self.__history.restore(frame)
+        self.rollbacks += 1
+        for again in range(frame,present):
+            self.__simulate(again)
+            self.resimulated += 1
+
+    def __receive(self,data):
+        '''Reads one packet from the peer'''
+        if len(data) < HEADER.size + RULES.size:
+            return
+        magic, version, first, received, ended, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or len(data) < HEADER.size + RULES.size + count:
+            return
+        if RULES.unpack_from(data,HEADER.size) != self.__rules:
+            self.__conflict = True
+            return
+        self.__acked = max(self.__acked,min(received,len(self.__local)))
+        if ended:
+            self.__peerEnded = ended
+
+        # Keeps the inputs that follow on from those already received
+        known = len(self.__remote)
+        if first <= known < first + count:
+            start = HEADER.size + RULES.size
+            self.__remote.extend(bytearray(data[start + known - first:start + count]))
+
+    def __packet(self):
+        '''Returns a packet of the local inputs the peer has not received'''
+        inputs = bytes(bytearray(self.__local[self.__acked:self.__acked + BURST]))
+        return (HEADER.pack(MAGIC,VERSION,self.__acked,len(self.__remote),self.__ended or 0,len(inputs)) +
+                RULES.pack(*self.__rules) + inputs)
+
+    def __send(self):
+        '''Sends a packet, dropped or held back as if the network were worse'''
+        if self.__loss and self.__random.random() < self.__loss:
+            return
+        if self.__delay:
+            self.__outbox.append((time.perf_counter() + self.__delay,self.__packet()))
+        else:
+            self.__transmit(self.__packet())
+
+    def __transmit(self,packet):
+        '''Sends a packet to the peer now'''
+        try:
+            self.__socket.sendto(packet,self.__peer)
+        except OSError:
+            pass
+
+def state(match):
+    '''Returns what the players can see of a match, to compare two peers'''
+    return (match.frame(),match.health1.health(),match.health2.health(),
+            tuple(match.player1.rect),tuple(match.player2.rect),
+            sorted(tuple(sprite.rect) for sprite in match.proj1),
+            sorted(tuple(sprite.rect) for sprite in match.proj2))
+
+def checkRestore(level,ports):
+    '''Plays 6 frames on guessed remote input against a peer faked on a
+    socket, sends the real input of the first 4, which rolls the match back,
+    then says the peer ended on frame 2. Returns whether the match went back
+    to the same state as an offline match of the first 2 frames.'''
+    match = HellBoundSim.Match(level)
+    session = Session(match,1,ports[0],("127.0.0.1",ports[1]))
+    peer = socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+    peer.bind(("",ports[1]))
+    local = [HellBoundSim.RIGHT] * 6
+    remote = [HellBoundSim.LEFT,HellBoundSim.LEFT,HellBoundSim.JUMP,HellBoundSim.JUMP]
+    try:
+        for bits in local:
+            session.step(bits)
+        for ended in (0,2):
+            packet = HEADER.pack(MAGIC,VERSION,0,0,ended,len(remote)) + RULES.pack(*match.rules()) + bytes(bytearray(remote))
+            peer.sendto(packet,("127.0.0.1",ports[0]))
+            time.sleep(0.05)
+            session.idle()
+    finally:
+        session.close()
+        peer.close()
+
+    offline = HellBoundSim.Match(level)
+    for frame in range(2):
+        offline.step(local[frame],remote[frame])
+    return session.rollbacks == 1 and state(match) == state(offline)
+
+def main(arguments=None):
+    '''Plays a match between two bots over loopback until it ends, and checks
+    that both peers and an offline match of the same inputs agree'''
+    parser = argparse.ArgumentParser(description="Play HellBound bots against each other over loopback with rollback.")
+    parser.add_argument("--frames",type=int,default=3600,help="most frames to play before the match should have ended")
+    parser.add_argument("--delay",type=float,default=60,help="milliseconds each packet is held back")
+    parser.add_argument("--loss",type=float,default=0.1,help="fraction of packets dropped")
+    parser.add_argument("--ports",type=int,nargs=2,default=[7000,7001],help="UDP ports of the two peers")
+    parser.add_argument("--level",default="level.txt",help="level to play on")
+    parser.add_argument("--bots",nargs=2,default=["rusher","zoner"],choices=sorted(HellBoundBots.BOTS),help="bots playing")
+    parser.add_argument("--seed",type=int,default=0,help="seed for the bots and the packet loss")
+    parser.add_argument("--rate",type=int,default=HellBoundSim.RATE,help="frames per second, 0 runs as fast as possible")
+    options = parser.parse_args(arguments)
+
+    # A peer that ended earlier takes the match back to a state saved before
+    # a rollback, which must hold the real input, not the guess
+    if not checkRestore(options.level,options.ports):
+        print("going back to the peer's end after a rollback is OUT OF SYNC")
+        return False
+
+    rng = random.Random(options.seed)
+    matches = (HellBoundSim.Match(options.level),HellBoundSim.Match(options.level))
+    bots = (HellBoundBots.BOTS[options.bots[0]](rng),HellBoundBots.BOTS[options.bots[1]](rng))
+    sessions = (Session(matches[0],1,options.ports[0],("127.0.0.1",options.ports[1]),
+                        options.delay / 1000.0,options.loss,seed=options.seed),
+                Session(matches[1],2,options.ports[1],("127.0.0.1",options.ports[0]),
+                        options.delay / 1000.0,options.loss,seed=options.seed + 1))
+    start = time.perf_counter()
+    tick = start
+    done = [False,False]
+    try:
+        # Plays until both peers have ended the match on the same frame. Each
+        # peer closes as soon as it is done, like the game does.
+        while not all(done):
+            if time.perf_counter() - start > options.frames * 2.0 / HellBoundSim.RATE + 10:
+                raise RuntimeError("the match did not end within " + str(options.frames) + " frames")
+            for side in range(2):
+                match, session = matches[side], sessions[side]
+                if done[side]:
+                    continue
+                if match.over():
+                    done[side] = session.finish()
+                    if done[side]:
+                        session.close()
+                elif match.frame() < options.frames:
+                    me, enemy = (match.player1,match.player2) if side == 0 else (match.player2,match.player1)
+                    session.step(bots[side].act(match,me,enemy))
+                else:
+                    session.idle()
+            if options.rate:
+                tick += 1.0 / options.rate
+                time.sleep(max(0.0,tick - time.perf_counter()))
+    finally:
+        for session in sessions:
+            session.close()
+
+    # Both peers should agree with a match played offline with the same input,
+    # and that it ended on the frame they stopped on
+    offline = HellBoundSim.Match(options.level)
+    bits1, bits2 = sessions[0].inputs()
+    for frame in range(len(bits1)):
+        offline.step(bits1[frame],bits2[frame])
+    synced = state(matches[0]) == state(matches[1]) == state(offline) and offline.over()
+    for side in range(2):
+        print("peer " + str(side + 1) + ": " + str(sessions[side].rollbacks) + " rollbacks, " +
+              str(sessions[side].resimulated) + " frames resimulated, " + str(sessions[side].stalls) + " stalls")
+    print("ended on frame " + str(matches[0].frame()) + " in " + str(round(time.perf_counter() - start,2)) + "s, " +
+          ("in sync" if synced else "OUT OF SYNC"))
+    return synced
+
+if __name__ == "__main__":
+    sys.exit(0 if main(sys.argv[1:]) else 1)
@@ -0,0 +1,147 @@
+""" Author: Anson Tran
+
+    Description: Times each phase of a frame (event polling, input,
+                 collisions, sprite updates, drawing and the display push),
+                 and the update method of each sprite class. The rolling
+                 averages can be shown in game with an overlay, and the
+                 timings exported as a Chrome trace (chrome://tracing or
+                 ui.perfetto.dev). When disabled, start() and stop() return
+                 straight away and sprite classes are left untouched.
+"""
+
+import time, json, pygame, HellBoundAssets
+from collections import deque
+
+class Profiler(object):
+    '''This class defines a frame profiler'''
+    def __init__(self,history=60,limit=200000):
+        '''The initializer takes the number of frames averaged, and the most
+        trace events to keep'''
+        self.enabled = False            # Times phases when True
+        self.tracing = False            # Keeps every timing for export when True
+        self.__history = history
+        self.__starts = {}              # Phase -> time it started
+        self.__totals = {}              # Phase -> seconds spent in it this frame
+        self.__frames = {}              # Phase -> seconds spent in it for recent frames
+        self.__events = deque(maxlen=limit)
+        self.__origin = time.perf_counter()
+        self.__patched = []             # (class, original update method)
+
+    def setEnabled(self,enabled,classes=()):
+        '''Turns profiling on or off. While on, the update method of each class
+        in classes is timed as well.'''
+        if enabled and not self.enabled:
+            for cls in classes:
+                self.__instrument(cls)
+        if not enabled:
+            self.__restore()
+        self.enabled = enabled
+
+    def start(self,name):
+        '''Marks the start of a phase'''
+        if self.enabled:
+            self.__starts[name] = time.perf_counter()
+
+    def stop(self,name):
+        '''Marks the end of a phase'''
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        began = self.__starts.pop(name,None)
+        if began is None:
+            return
+        self.__totals[name] = self.__totals.get(name,0.0) + now - began
+        if self.tracing:
+            self.__events.append((name,began,now - began))
+
+    def frame(self):
+        '''Marks the end of a frame, and adds its timings to the history'''
+        if not self.enabled:
+            return
+        for name in set(self.__frames) | set(self.__totals):
+            if name not in self.__frames:
+                self.__frames[name] = deque(maxlen=self.__history)
+            self.__frames[name].append(self.__totals.get(name,0.0))
+        self.__totals = {}
+
+    def averages(self):
+        '''Returns a list of (phase, average milliseconds per frame), slowest first'''
+        averages = []
+        for name in self.__frames:
+            values = self.__frames[name]
+            if values:
+                averages.append((name,sum(values) / len(values) * 1000))
+        averages.sort(key=lambda average: -average[1])
+        return averages
+
+    def export(self,path):
+        '''Writes the trace events to a Chrome trace file'''
+        events = []
+        for name, began, duration in self.__events:
+            events.append({"name": name,"cat": "frame","ph": "X","pid": 0,"tid": 0,
+                           "ts": round((began - self.__origin) * 1000000,1),
+                           "dur": round(duration * 1000000,1)})
+        output = open(path,"w")
+        json.dump({"traceEvents": events,"displayTimeUnit": "ms"},output)
+        output.close()
+
+    def __instrument(self,cls):
+        '''Replaces the update method of a class with a timed one'''
+        original = cls.__dict__.get("update")
+        if original is None:
+            return
+        name = cls.__name__ + ".update"
+        profiler = self
+        def update(sprite,*arguments):
+            profiler.start(name)
+            original(sprite,*arguments)
+            profiler.stop(name)
+        cls.update = update
+        self.__patched.append((cls,original))
+
+    def __restore(self):
+        '''Puts back the original update methods'''
+        for cls, original in self.__patched:
+            cls.update = original
+        self.__patched = []
+
+class Overlay(pygame.sprite.Sprite):
+    '''This class defines a sprite showing the profiler's rolling timings'''
+    def __init__(self,profiler,x=10,y=50,every=15):
+        '''The initializer takes the profiler, the top left corner, and how
+        many frames to wait between redrawing the text'''
+        pygame.sprite.Sprite.__init__(self)
+        self.__profiler = profiler
+        self.__every = every
+        self.__count = 0
+        self.image = pygame.Surface((1,1),pygame.SRCALPHA,32)
+        self.rect = self.image.get_rect()
+        self.rect.topleft = (x,y)
+
+    def update(self):
+        '''Redraws the timings every few frames'''
+        self.__count += 1
+        if self.__count < self.__every:
+            return
+        self.__count = 0
+
+        # One line per phase, eg. "Player.update  0.012 ms", put together from cached runs of text
+        lines = [HellBoundAssets.compose("rez/ARCADECLASSIC.TTF",16,name + "  " + ("%.3f" % milliseconds) + " ms",(255,255,0))
+                 for name, milliseconds in self.__profiler.averages()]
+        if not lines:
+            return
+        width = max(line.get_width() for line in lines)
+        height = sum(line.get_height() for line in lines)
+        image = pygame.Surface((width,height),pygame.SRCALPHA,32)
+        image.fill((0,0,0,160))
+        y = 0
+        for line in lines:
+            image.blit(line,(0,y))
+            y += line.get_height()
+        topleft = self.rect.topleft
+        self.image = HellBoundAssets.displayFormat(image)
+        self.rect = self.image.get_rect()
+        self.rect.topleft = topleft
+
+# The profiler shared by the game loop, the match and the renderer
+profiler = Profiler()
@@ -0,0 +1,187 @@
+""" Author: Anson Tran
+
+    Description: The renderer used by every scene. In full mode it clears and
+                 draws the sprites and flips the whole display, like the
+                 original scene loops. In dirty mode it remembers where each
+                 sprite was drawn, and only repaints and pushes the regions
+                 of sprites that moved, changed image, appeared or vanished.
+                 The interpolator places moving sprites between simulation
+                 steps when the display runs faster or slower than the match.
+"""
+
+import pygame, HellBoundProfile
+
+class Renderer(object):
+    '''This class draws a group of sprites over a background'''
+    def __init__(self,screen,background,dirty=False):
+        '''The initializer takes the screen, the background surface, and
+        whether to only update the changed regions of the screen'''
+        self.__screen = screen
+        self.__dirty = dirty
+        self.__last = {}   # Sprite -> (image, rect) as it was last drawn
+        self.setBackground(background)
+
+    def setBackground(self,background):
+        '''Sets the background, and repaints the whole screen on the next frame'''
+        self.__background = background
+        self.__full = True
+
+    def dirty(self):
+        '''Tells us whether only changed regions are pushed'''
+        return self.__dirty
+
+    def render(self,group):
+        '''Draws the group and pushes it to the display. Call after the
+        group has been updated. Returns the list of rects that were pushed.
+        This is the last thing done in a frame, so it also ends the profiler's frame.'''
+        if not self.__dirty:
+            rects = self.__renderFull(group)
+        else:
+            rects = self.__renderDirty(group)
+        HellBoundProfile.profiler.frame()
+        return rects
+
+    def __renderFull(self,group):
+        '''Clears and draws every sprite and flips the whole display'''
+        profiler = HellBoundProfile.profiler
+        profiler.start("draw")
+        if self.__full:
+            self.__screen.blit(self.__background,(0,0))
+            self.__full = False
+        group.clear(self.__screen,self.__background)
+        group.draw(self.__screen)
+        profiler.stop("draw")
+        profiler.start("display")
+        pygame.display.flip()
+        profiler.stop("display")
+        return [self.__screen.get_rect()]
+
+    def __renderDirty(self,group):
+        '''Repaints and pushes only the regions that changed since the last frame'''
+        profiler = HellBoundProfile.profiler
+        profiler.start("draw")
+        sprites = group.sprites()
+        current = {}
+        changed = []
+
+        # Compares every sprite to how it was last drawn
+        for sprite in sprites:
+            rect = pygame.Rect(sprite.rect)
+            last = self.__last.get(sprite)
+            if last is None or last[0] is not sprite.image or last[1] != rect:
+                if last is not None:
+                    changed.append(last[1])
+                changed.append(rect)
+            current[sprite] = (sprite.image,rect)
+
+        # Sprites that were removed leave a hole to repaint
+        for sprite in self.__last:
+            if sprite not in current:
+                changed.append(self.__last[sprite][1])
+        self.__last = current
+
+        # Repaints everything on the first frame, or after the background changed
+        if self.__full:
+            self.__full = False
+            self.__screen.blit(self.__background,(0,0))
+            for sprite in sprites:
+                self.__screen.blit(sprite.image,sprite.rect)
+            profiler.stop("draw")
+            profiler.start("display")
+            pygame.display.flip()
+            profiler.stop("display")
+            return [self.__screen.get_rect()]
+
+        dirty = self.__merge(changed)
+
+        # Repaints each region, clipped so sprites outside it are not painted over
+        for rect in dirty:
+            self.__screen.set_clip(rect)
+            self.__screen.blit(self.__background,rect,rect)
+            for sprite in sprites:
+                if rect.colliderect(current[sprite][1]):
+                    self.__screen.blit(sprite.image,sprite.rect)
+        self.__screen.set_clip(None)
+        profiler.stop("draw")
+
+        profiler.start("display")
+        pygame.display.update(dirty)
+        profiler.stop("display")
+        return dirty
+
+    def __merge(self,rects):
+        '''Joins overlapping rects, so no pixel is repainted or pushed twice'''
+        merged = []
+        for rect in rects:
+            if rect.width <= 0 or rect.height <= 0:
+                continue
+            rect = pygame.Rect(rect)
+            # Keeps absorbing overlapping rects until none are left
+            index = rect.collidelist(merged)
+            while index != -1:
+                rect.union_ip(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+class StaticLayer(object):
+    '''This class bakes sprites that never move, such as platforms, into a
+    copy of the background. The copy is only rebuilt when the sprites or
+    the background change.'''
+    def __init__(self):
+        '''The initializer starts with nothing baked'''
+        self.__key = None      # Describes what the baked surface was built from
+        self.__surface = None  # The background with the sprites drawn on it
+
+    def bake(self,background,sprites):
+        '''Returns the background with the sprites drawn on it'''
+        key = (id(background),tuple((id(sprite.image),tuple(sprite.rect)) for sprite in sprites))
+        if key != self.__key:
+            self.__surface = background.copy()
+            for sprite in sprites:
+                self.__surface.blit(sprite.image,sprite.rect)
+            self.__key = key
+        return self.__surface
+
+class Interpolator(object):
+    '''This class draws moving sprites part of the way between where they
+    were before the last simulation step and where they are now, so motion
+    stays smooth when the display and the simulation run at different rates.
+    A sprite's anchor attribute names the point of its rect that is moved,
+    eg. "midbottom" for players, and defaults to "center".'''
+    def __init__(self):
+        '''The initializer starts with no positions remembered'''
+        self.__previous = {}  # Sprite -> anchor point before the last step
+        self.__moved = []     # (sprite, simulated rect) for sprites drawn in between
+
+    def capture(self,sprites):
+        '''Remembers where each sprite is, call before every simulation step'''
+        self.__previous = {}
+        for sprite in sprites:
+            self.__previous[sprite] = getattr(sprite.rect,self.__anchor(sprite))
+
+    def apply(self,sprites,alpha):
+        '''Moves each sprite alpha of the way, from 0 to 1, from its previous
+        position to its current one. Call restore() once drawn.'''
+        for sprite in sprites:
+            previous = self.__previous.get(sprite)
+            anchor = self.__anchor(sprite)
+            current = getattr(sprite.rect,anchor)
+            # New sprites are drawn where they are
+            if previous is None or previous == current:
+                continue
+            rect = pygame.Rect(sprite.rect)
+            setattr(rect,anchor,(int(round(previous[0] + (current[0] - previous[0]) * alpha)),
+                                 int(round(previous[1] + (current[1] - previous[1]) * alpha))))
+            self.__moved.append((sprite,sprite.rect))
+            sprite.rect = rect
+
+    def restore(self):
+        '''Puts back the simulated rects of the sprites moved by apply()'''
+        for sprite, rect in self.__moved:
+            sprite.rect = rect
+        self.__moved = []
+
+    def __anchor(self,sprite):
+        '''Returns the name of the rect point that is moved'''
+        return getattr(sprite,"anchor","center")
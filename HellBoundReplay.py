@@ -0,0 +1,127 @@
+""" Author: Anson Tran
+
+    Description: Records the input of a match and plays it back. A match is
+                 decided entirely by the two players' input bits, so a replay
+                 file only holds a small header (the level's SHA-1, the seed,
+                 the number of players and the rules, eg. the fireballs each
+                 player may have in play) followed by one byte per player
+                 every frame, in player order. Playing a replay through
+                 HellBoundSim, or through game(), gives the same match every
+                 time. Replays of the older formats, without the rules or
+                 the number of players, are still read.
+
+                 Run "python HellBoundReplay.py replay.hbr" to play a replay
+                 headless and print the result.
+"""
+
+import struct, HellBoundLevel, HellBoundSim
+
+# Replay format: a header, the number of players and the rules, followed by
+# one byte of input bits per player every frame
+MAGIC = b"HBRP"
+VERSION = 3
+HEADER = struct.Struct("<4sH20sI") # magic, version, level sha1, seed
+PLAYERS = struct.Struct("<B")      # number of players
+RULES = struct.Struct("<BB?")      # fireballs, cooldown, clashes
+FRAME = struct.Struct("<BB")       # player 1 bits, player 2 bits
+
+# Older formats, played with the default rules: a duel's first format, and a
+# free-for-all's, with the number of players after the header
+DUEL_VERSION = 1
+PLAYERS_VERSION = 2
+
+def frameFormat(players):
+    '''Returns the struct of one frame of input bits for a number of players'''
+    if players == 2:
+        return FRAME
+    return struct.Struct("<" + "B" * players)
+
+class Recorder(object):
+    '''This class writes the input of a match to a replay file'''
+    def __init__(self,path,level="level.txt",seed=0,players=2,rules=None):
+        '''The initializer takes the replay's path, the level's path, the seed,
+        the number of players, and the match's rules, from Match.rules()'''
+        if rules is None:
+            rules = (HellBoundSim.FIREBALLS,HellBoundSim.COOLDOWN,HellBoundSim.CLASHES)
+
+        # Frames are buffered and written in blocks, not one write per frame
+        self.__file = open(path,"wb",65536)
+        self.__frame = frameFormat(players)
+        self.__file.write(HEADER.pack(MAGIC,VERSION,HellBoundLevel.digest(level),seed))
+        self.__file.write(PLAYERS.pack(players))
+        self.__file.write(RULES.pack(*rules))
+        self.__frames = 0
+
+    def record(self,*bits):
+        '''Adds one frame of input, with each player's bits in player order'''
+        self.__file.write(self.__frame.pack(*bits))
+        self.__frames += 1
+
+    def frames(self):
+        '''Returns the number of frames recorded'''
+        return self.__frames
+
+    def close(self):
+        '''Writes anything left in the buffer and closes the file'''
+        if not self.__file.closed:
+            self.__file.close()
+
+class Replay(object):
+    '''This class reads a replay file'''
+    def __init__(self,path):
+        '''The initializer takes the path of the replay'''
+        source = open(path,"rb")
+        data = source.read()
+        source.close()
+        if len(data) < HEADER.size:
+            raise ValueError(path + " is not a HellBound replay")
+        magic, version, self.levelDigest, self.seed = HEADER.unpack_from(data)
+        if magic != MAGIC or version not in (VERSION,DUEL_VERSION,PLAYERS_VERSION):
+            raise ValueError(path + " is not a HellBound replay")
+        start = HEADER.size
+        self.players = 2
+        self.rules = (HellBoundSim.FIREBALLS,HellBoundSim.COOLDOWN,HellBoundSim.CLASHES)
+        if version != DUEL_VERSION:
+            self.players = PLAYERS.unpack_from(data,start)[0]
+            start += PLAYERS.size
+        if version == VERSION:
+            self.rules = RULES.unpack_from(data,start)
+            start += RULES.size
+        self.__frame = frameFormat(self.players)
+        self.__frames = data[start:]
+        self.__count = len(self.__frames) // self.__frame.size
+
+    def __len__(self):
+        '''Returns the number of frames in the replay'''
+        return self.__count
+
+    def bits(self,frame):
+        '''Returns (player 1 bits, player 2 bits, ...) for a frame'''
+        return self.__frame.unpack_from(self.__frames,frame * self.__frame.size)
+
+    def check(self,level):
+        '''Raises ValueError if the replay was recorded on a different level'''
+        if HellBoundLevel.digest(level) != self.levelDigest:
+            raise ValueError("the replay was recorded on a different level than " + level)
+
+    def play(self,match):
+        '''Plays every frame of the replay through a HellBoundSim.Match, as
+        fast as possible, and returns the match'''
+        for frame in range(self.__count):
+            match.step(*self.bits(frame))
+        return match
+
+def main():
+    '''Plays a replay headless and prints the result'''
+    import sys, time
+    replay = Replay(sys.argv[1])
+    level = sys.argv[2] if len(sys.argv) > 2 else "level.txt"
+    replay.check(level)
+    start = time.time()
+    match = replay.play(HellBoundSim.Match(level,None,*replay.rules,players=replay.players))
+    seconds = time.time() - start
+    print(str(len(replay)) + " frames in " + str(round(seconds,3)) + "s, winner: " + str(match.winner()) +
+          ", health: " + " ".join(str(health.health()) for health in match.healths))
+
+if __name__ == "__main__":
+    main()
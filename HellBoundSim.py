@@ -0,0 +1,559 @@
+""" Author: Anson Tran
+
+    Description: The rules of a HellBound match, without the window or the
+                 speakers. A Match takes each player's input for a frame as a
+                 small number of bits, moves the players and fireballs,
+                 applies damage, and returns the sounds the frame asked for.
+                 game() draws and plays whatever the Match decides, and
+                 tools can run a Match with no display at all. A match is a
+                 duel by default, or a free-for-all of up to 8 players.
+
+                 Run "python HellBoundSim.py [players]" to time random matches.
+"""
+
+import pygame, HellBoundSprites, HellBoundLevel, HellBoundProfile
+
+# Input bits for one player on one frame
+LEFT = 1
+RIGHT = 2
+CROUCH = 4
+JUMP = 8
+ATTACK = 16
+FIREBALL = 32
+DEFEND = 64
+
+# Keys used by each player, as (key, input bit)
+KEYS1 = ((pygame.K_a,LEFT),(pygame.K_d,RIGHT),(pygame.K_s,CROUCH),(pygame.K_w,JUMP),
+         (pygame.K_g,ATTACK),(pygame.K_h,FIREBALL),(pygame.K_j,DEFEND))
+KEYS2 = ((pygame.K_LEFT,LEFT),(pygame.K_RIGHT,RIGHT),(pygame.K_DOWN,CROUCH),(pygame.K_UP,JUMP),
+         (pygame.K_COMMA,ATTACK),(pygame.K_PERIOD,FIREBALL),(pygame.K_SLASH,DEFEND))
+KEYS3 = ((pygame.K_KP4,LEFT),(pygame.K_KP6,RIGHT),(pygame.K_KP5,CROUCH),(pygame.K_KP8,JUMP),
+         (pygame.K_KP1,ATTACK),(pygame.K_KP2,FIREBALL),(pygame.K_KP3,DEFEND))
+KEYS4 = ((pygame.K_k,LEFT),(pygame.K_SEMICOLON,RIGHT),(pygame.K_l,CROUCH),(pygame.K_o,JUMP),
+         (pygame.K_p,ATTACK),(pygame.K_LEFTBRACKET,FIREBALL),(pygame.K_RIGHTBRACKET,DEFEND))
+
+# Key layouts of the players that can share the keyboard, in player order
+KEYMAPS = (KEYS1,KEYS2,KEYS3,KEYS4)
+
+# Most players in a match
+MAX_PLAYERS = 8
+
+# Healthbar colours of a free-for-all, in player order. A duel's are both red.
+COLORS = ((255,0,0),(0,120,255),(0,200,0),(255,220,0),(255,0,255),(0,230,230),(255,140,0),(255,255,255))
+
+# Size of the arena, the same as the window
+SIZE = (920,520)
+
+# Frames simulated per second, whatever rate the display runs at
+RATE = 60
+
+# Frames the match carries on for after a player dies
+END_DELAY = 300
+
+# Fireballs each player may have in play at once, and the frames after a
+# shot before the player may fire again
+FIREBALLS = 1
+COOLDOWN = 0
+
+# (fireballs, cooldown) of barrage mode, with dozens of fireballs in play
+BARRAGE = (24,4)
+
+# Enemy fireballs that touch destroy each other when True
+CLASHES = False
+
+# Size in pixels of the cells of the collision grid, and the number of
+# players and fireballs the grid pairs up directly, without the cells
+CELL = 128
+FEW = 4
+
+def keyBits(pressed,keys):
+    '''Takes the result of pygame.key.get_pressed() and a key layout, and returns the input bits'''
+    bits = 0
+    for key, bit in keys:
+        if pressed[key]:
+            bits |= bit
+    return bits
+
+class Arena(object):
+    '''This class stands in for the screen when there is no window. Sprites
+    only need its size.'''
+    def __init__(self,width,height):
+        '''The initializer takes the width and height of the arena'''
+        self.__width = width
+        self.__height = height
+
+    def get_width(self):
+        '''Returns the width of the arena'''
+        return self.__width
+
+    def get_height(self):
+        '''Returns the height of the arena'''
+        return self.__height
+
+class Grid(object):
+    '''This class finds the players and fireballs that may be touching. Each
+    frame, everything that moves is added to the cells of a uniform grid
+    under its rect, and only things sharing a cell are paired up, so the
+    cost follows the number of things and of contacts, not every pair.'''
+    def __init__(self,cell=CELL,few=FEW):
+        '''The initializer takes the size of a cell in pixels, and the number
+        of things up to which every pair is returned without using the cells'''
+        self.__cell = cell
+        self.__few = few
+        self.__cells = {}   # (column, row) -> indexes of the things in that cell
+        self.__things = []  # Things added since the grid was cleared
+
+    def clear(self):
+        '''Empties the grid, call at the start of every frame'''
+        del self.__things[:]
+
+    def add(self,thing):
+        '''Adds a thing with a rect'''
+        self.__things.append(thing)
+
+    def pairs(self):
+        '''Returns a list of (thing, thing) pairs sharing a cell, each pair
+        once, with the thing added first on the left. Whether their rects
+        touch is up to the caller.'''
+        things = self.__things
+        found = []
+
+        # Sorting a few things into cells costs more than pairing them all
+        if len(things) <= self.__few:
+            for first in range(len(things) - 1):
+                for second in range(first + 1,len(things)):
+                    found.append((things[first],things[second]))
+            return found
+
+        # Registers every thing in each cell its rect covers
+        cell = self.__cell
+        cells = self.__cells
+        cells.clear()
+        for index in range(len(things)):
+            rect = things[index].rect
+            columns = range(rect.left // cell,(rect.right - 1) // cell + 1)
+            for row in range(rect.top // cell,(rect.bottom - 1) // cell + 1):
+                for column in columns:
+                    members = cells.get((column,row))
+                    if members is None:
+                        cells[(column,row)] = [index]
+                    else:
+                        members.append(index)
+
+        seen = set()
+        for members in cells.values():
+            if len(members) < 2:
+                continue
+            for first in range(len(members) - 1):
+                for second in range(first + 1,len(members)):
+                    # Things covering several cells would be paired in each
+                    key = (members[first],members[second])
+                    if key not in seen:
+                        seen.add(key)
+                        found.append((things[key[0]],things[key[1]]))
+        return found
+
+class Pool(object):
+    '''This class holds a player's fireballs, all made when the match starts.
+    A fireball out of play is dead, and firing resets one in place, so a
+    match makes no fireballs while it is played.'''
+    def __init__(self,screen,player,size):
+        '''The initializer takes the screen, the player firing, and the most
+        fireballs the player may have in play'''
+        self.__fireballs = [HellBoundSprites.Projectile(screen,player.get_projData()) for index in range(size)]
+        for projectile in self.__fireballs:
+            projectile.kill()
+
+    def __len__(self):
+        '''Returns the number of fireballs in the pool'''
+        return len(self.__fireballs)
+
+    def __iter__(self):
+        '''Goes through every fireball in the pool, in play or not'''
+        return iter(self.__fireballs)
+
+    def fire(self,player):
+        '''Returns a fireball out of play, reset to fly from the player, or
+        None if every fireball is in play'''
+        for projectile in self.__fireballs:
+            if not projectile.alive():
+                projectile.reset(player.get_projData())
+                return projectile
+        return None
+
+class Match(object):
+    '''This class defines one match, a duel between player 1 and player 2 or
+    a free-for-all between more players. The players, their healthbars and
+    their fireballs are kept in lists, in player order.'''
+    def __init__(self,level="level.txt",screen=None,fireballs=FIREBALLS,cooldown=COOLDOWN,clashes=CLASHES,players=2):
+        '''The initializer takes a level, or the path to one, the screen, the
+        most fireballs each player may have in play, the frames between shots,
+        whether enemy fireballs destroy each other, and the number of players.
+        Without a screen, the match runs headless and makes no sprites.'''
+        if not 2 <= players <= MAX_PLAYERS:
+            raise ValueError("a match needs 2 to " + str(MAX_PLAYERS) + " players, not " + str(players))
+        self.__drawn = screen is not None
+        if screen is None:
+            screen = Arena(SIZE[0],SIZE[1])
+        if not isinstance(level,HellBoundLevel.Level):
+            level = HellBoundLevel.Level(level)
+        self.__screen = screen
+        self.__level = level
+
+        # Players and their health. Players start spread across the arena
+        # facing the middle, and look like player 1 or player 2.
+        width = screen.get_width()
+        self.players = []
+        self.healths = []
+        for index in range(players):
+            x = width / 5 + width / 5 * 3 * index / (players - 1)
+            facing = "right" if x < width / 2 else "left"
+            self.players.append(HellBoundSprites.Player(screen,str(index % 2 + 1),x,0,facing,level))
+            self.healths.append(self.__healthBar(screen,index,players))
+
+        # Fireballs of each player in play, and those they are fired from
+        self.projs = [[] for player in self.players]
+        self.__pools = [Pool(screen,player,fireballs) for player in self.players]
+
+        # Frame each player may fire again on
+        self.__fireballs = fireballs
+        self.__cooldown = cooldown
+        self.__reloads = [0] * players
+
+        # Collisions are found with a grid. Each player and fireball belongs
+        # to the side of the player's index.
+        self.__clashes = bool(clashes)
+        self.__grid = Grid()
+        self.__sides = {}
+        for index in range(players):
+            self.__sides[self.players[index]] = index
+            for projectile in self.__pools[index]:
+                self.__sides[projectile] = index
+
+        # The players and healthbars of a duel, by name
+        self.player1, self.player2 = self.players[0], self.players[1]
+        self.health1, self.health2 = self.healths[0], self.healths[1]
+        self.proj1, self.proj2 = self.projs[0], self.projs[1]
+
+        # Every entity in play, in the order they are updated
+        self.__entities = self.players + self.healths
+
+        # The sprites drawing the entities, in the order they are drawn. Other
+        # sprites, such as labels, may be added and are updated every frame.
+        self.sprites = pygame.sprite.OrderedUpdates()
+        for entity in self.__entities:
+            self.__show(entity)
+
+        # A free-for-all's players have their number above them, in the colour
+        # of their healthbar
+        self.markers = []
+        if self.__drawn and players > 2:
+            self.markers = [HellBoundSprites.Marker(self.players[index],index + 1,COLORS[index]) for index in range(players)]
+            self.sprites.add(*self.markers)
+
+        self.__frame = 0 # Frames simulated so far
+        self.__delay = 0 # Frames since the last player standing was left
+
+    def level(self):
+        '''Returns the level the match is played on'''
+        return self.__level
+
+    def rules(self):
+        '''Returns the rules the match is played with, (fireballs, cooldown,
+        clashes). A replay, or an online peer, must be played with the same rules.'''
+        return (self.__fireballs,self.__cooldown,self.__clashes)
+
+    def frame(self):
+        '''Returns the number of frames simulated'''
+        return self.__frame
+
+    def over(self):
+        '''Tells us whether the match has finished'''
+        return self.__delay >= END_DELAY
+
+    def winner(self):
+        '''Returns the number of the winner, from 1, 0 for a draw, or None
+        while more than one player is alive'''
+        alive = [index for index in range(len(self.players)) if not self.healths[index].dead()]
+        if not alive:
+            return 0
+        if len(alive) == 1:
+            return alive[0] + 1
+        return None
+
+    def nearest(self,player):
+        '''Returns the closest other player still alive, or the closest other
+        player if they are all dead, eg. for a bot to fight'''
+        closest = None
+        for index in range(len(self.players)):
+            other = self.players[index]
+            if other is player:
+                continue
+            key = (self.healths[index].dead(),abs(other.rect.centerx - player.rect.centerx))
+            if closest is None or key < closest[0]:
+                closest = (key,other)
+        return closest[1]
+
+    def snapshot(self):
+        '''Returns the state of the match as a tuple, that restore() can return
+        it to. Images are shared rather than copied, as entities replace their
+        images instead of drawing on them.'''
+        return (self.__frame,self.__delay,
+                tuple(player.getState() for player in self.players),
+                tuple(health.getState() for health in self.healths),
+                tuple(tuple((projectile,projectile.getState()) for projectile in proj) for proj in self.projs),
+                tuple(self.__entities),tuple(self.__reloads))
+
+    def restore(self,state):
+        '''Returns the match to a state from snapshot(). Sprites added to
+        self.sprites that the match does not own, such as labels, are kept.'''
+        self.__frame, self.__delay, players, healths, projs, entities, reloads = state
+        self.__reloads[:] = reloads
+        for index in range(len(self.players)):
+            self.players[index].setState(players[index])
+            self.healths[index].setState(healths[index])
+        for proj in projs:
+            for projectile, values in proj:
+                projectile.setState(values)
+
+        # Puts back the entities that were in play, only if some have been
+        # added or killed since
+        if tuple(self.__entities) != entities:
+            for entity in self.__entities:
+                if entity not in entities:
+                    entity.kill()
+            for entity in entities:
+                entity.revive()
+            self.__entities = list(entities)
+            for index in range(len(self.projs)):
+                self.projs[index][:] = [projectile for projectile, values in projs[index]]
+
+            # Draws them in the order they are updated, with other sprites on top
+            if self.__drawn:
+                views = [entity.view() for entity in entities]
+                owned = set(views)
+                others = [sprite for sprite in self.sprites.sprites() if sprite not in owned]
+                self.sprites.empty()
+                self.sprites.add(*(views + others))
+
+    def step(self,*bits):
+        '''Simulates one frame with each player's input bits, in player order.
+        Returns a list of the sounds the frame played: "cut", "block" and "fireball".'''
+        sounds = []
+        profiler = HellBoundProfile.profiler
+        players = self.players
+        healths = self.healths
+
+        # INPUT
+        profiler.start("input")
+        for index in range(len(players)):
+            self.__control(index,bits[index],sounds)
+        profiler.stop("input")
+
+        # COLLISION DETECTION
+        profiler.start("collision")
+        grid = self.__grid
+        grid.clear()
+        for player in players:
+            grid.add(player)
+        for proj in self.projs:
+            for projectile in proj:
+                grid.add(projectile)
+
+        # Only tests the pairs the grid found close to each other, and never
+        # things on the same side
+        sides = self.__sides
+        burned = set()
+        for first, second in grid.pairs():
+            side1 = sides[first]
+            side2 = sides[second]
+            if side1 == side2 or not first.rect.colliderect(second.rect):
+                continue
+            firstPlayer = players[side1] is first
+            secondPlayer = players[side2] is second
+            if firstPlayer and secondPlayer:
+                self.__melee(side1,side2)
+                self.__melee(side2,side1)
+            # Fireball collisions only affect your enemies
+            elif firstPlayer:
+                burned.add(side1)
+            elif secondPlayer:
+                burned.add(side2)
+            # Enemy fireballs that meet destroy each other
+            elif self.__clashes:
+                first.kill()
+                second.kill()
+
+        # Fireball collisions only do damage if the enemy is not defending,
+        # however many fireballs touch them
+        for index in range(len(players)):
+            if index in burned and not players[index].defend():
+                healths[index].loseHealth(2)
+
+        # Counts down to the end of the match once one player or none is
+        # left, faster if none is
+        dead = 0
+        for health in healths:
+            if health.dead():
+                dead += 1
+        if dead >= len(players) - 1:
+            self.__delay += dead - len(players) + 2
+        profiler.stop("collision")
+
+        # Moves every entity, then any other sprites
+        profiler.start("update")
+        for entity in self.__entities:
+            entity.update()
+        self.sprites.update()
+
+        # Forgets the entities that left play
+        if not all(entity.alive() for entity in self.__entities):
+            self.__entities = [entity for entity in self.__entities if entity.alive()]
+            for proj in self.projs:
+                proj[:] = [projectile for projectile in proj if projectile.alive()]
+        profiler.stop("update")
+        self.__frame += 1
+        return sounds
+
+    def __healthBar(self,screen,index,players):
+        '''Returns the healthbar of a player. A duel's meet in the middle, a
+        free-for-all's are in rows of 4 under the timer.'''
+        width = screen.get_width()
+        if players == 2:
+            if index == 0:
+                return HellBoundSprites.HealthBar(screen,(width/5)*2,30,"right")
+            return HellBoundSprites.HealthBar(screen,(width/5)*3,30,"left")
+        x = (width - 4 * 215 + 15) / 2 + (index % 4) * 215
+        return HellBoundSprites.HealthBar(screen,x,60 + (index // 4) * 20,"left",COLORS[index])
+
+    def __show(self,entity):
+        '''Adds the sprite of an entity to the sprites drawn, unless headless'''
+        if self.__drawn:
+            self.sprites.add(entity.view())
+
+    def __melee(self,attacker,defender):
+        '''Applies the sword attack of a player on another touching them, by index'''
+        # If the attacker is attacking
+        if self.players[attacker].damage():
+            # Reduced damage if the defender is defending
+            if self.players[defender].defend():
+                self.healths[defender].loseHealth(2)
+            # Full damage if the defender is not
+            else:
+                self.healths[defender].loseHealth(10)
+
+    def __control(self,index,bits,sounds):
+        '''Applies the input bits of the player at an index for this frame'''
+        player = self.players[index]
+
+        # Tells the player to die if its healthbar is empty
+        if self.healths[index].dead():
+            player.dead(True)
+            return
+
+        # Moves the player left
+        if bits & LEFT:
+            player.move(-6,"left")
+            player.state("movement")
+        # Changes to crouch position
+        elif bits & CROUCH:
+            player.state("crouch")
+        # Moves the player right
+        elif bits & RIGHT:
+            player.move(6,"right")
+            player.state("movement")
+
+        # Attack/Defend
+        else:
+            # Sword attack
+            if bits & ATTACK:
+                player.state("attack")
+                if player.sound():
+                    sounds.append("cut")
+            # Shoots a fireball if the player has one left and has reloaded
+            elif bits & FIREBALL:
+                projectile = None
+                if self.__frame >= self.__reloads[index]:
+                    projectile = self.__pools[index].fire(player)
+                if projectile is not None:
+                    self.__reloads[index] = self.__frame + self.__cooldown
+                    self.projs[index].append(projectile)
+                    self.__entities.append(projectile)
+                    self.__show(projectile)
+                    sounds.append("fireball")
+                else:
+                    player.state("movement")
+                    player.stop("x")
+            # Defending
+            elif bits & DEFEND:
+                player.state("defend")
+                if player.sound():
+                    sounds.append("block")
+            # Otherwise, movement
+            else:
+                player.stop("x")
+                player.state("movement")
+
+        # Jumping
+        if bits & JUMP:
+            player.jump()
+
+class History(object):
+    '''This class keeps snapshots of the last few frames of a match in a ring
+    buffer, so the match can be rewound to any of them'''
+    def __init__(self,match,size=60):
+        '''The initializer takes the match and the number of frames to keep'''
+        self.__match = match
+        self.__size = size
+        self.__states = [None] * size   # Snapshot of each frame, in slot frame % size
+        self.__frames = [-1] * size     # Frame held in each slot
+
+    def __len__(self):
+        '''Returns the number of frames the history holds at most'''
+        return self.__size
+
+    def __contains__(self,frame):
+        '''Tells us whether the state before a frame is held'''
+        return frame >= 0 and self.__frames[frame % self.__size] == frame
+
+    def save(self):
+        '''Keeps the state of the match before its next frame, replacing the
+        oldest frame held'''
+        frame = self.__match.frame()
+        slot = frame % self.__size
+        self.__states[slot] = self.__match.snapshot()
+        self.__frames[slot] = frame
+
+    def restore(self,frame):
+        '''Returns the match to the state before a frame. Raises KeyError if
+        the frame is no longer held.'''
+        if frame not in self:
+            raise KeyError("frame " + str(frame) + " is not in the history")
+        self.__match.restore(self.__states[frame % self.__size])
+
+    def clear(self):
+        '''Forgets every frame held'''
+        self.__states = [None] * self.__size
+        self.__frames = [-1] * self.__size
+
+def main(players=2):
+    '''Times headless matches with random inputs'''
+    import random, time
+    random.seed(0)
+    frames = 0
+    start = time.time()
+    for game in range(10):
+        match = Match(players=players)
+        bits = [0] * players
+        while not match.over() and match.frame() < 3600:
+            # Holds random inputs for a few frames at a time, like a player would
+            if match.frame() % 10 == 0:
+                bits = [random.randrange(128) for player in range(players)]
+            match.step(*bits)
+        frames += match.frame()
+    seconds = time.time() - start
+    print(str(frames) + " frames in " + str(round(seconds,2)) + "s, " + str(int(frames / seconds)) + " frames per second")
+
+if __name__ == "__main__":
+    import sys
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2)
@@ -1,28 +1,163 @@
-import pygame
-class Player(pygame.sprite.Sprite):
-    '''This class defines the sprite for our player'''
+import os, pygame, HellBoundAssets, HellBoundHUD
+
+# Player animations, as indexes into a player's animation table
+IDLE, SPRINT, JUMP, CROUCH, DEFEND, ATTACK, DYING = range(7)
+
+# Name of each player animation in the atlas, the frames it lasts, and the
+# frames each of its images is shown for, in the order of the indexes above
+ANIMATIONS = (("idle",120,30),("sprint",1,1),("jump",8,1),("crouch",60,30),
+              ("defend",12,1),("attack",32,4),("dying",100,20))
+
+# The fireball animation: the frames it lasts, and the frames each image is shown for
+FIREBALL = ("projectile",50,10)
+
+# Directions a sprite can face, as indexes into an animation table
+FACING = {"left": 0, "right": 1}
+
+class Atlas(object):
+    '''This class serves animation frames as subsurfaces of a packed atlas.
+    Atlases are built by HellBoundAtlas.py. If a player has no atlas, frames
+    are loaded from their own files instead.'''
+    # Atlases that have been loaded, by player number
+    __loaded = {}
+    
+    def __init__(self,playerNum,sheet,index):
+        '''The initializer takes the player number, the atlas surface, and the path to its index'''
+        self.__playerNum = playerNum
+        self.__sheet = sheet
+        self.__frames = {}
+        self.__tables = {}
+        
+        # Cuts a subsurface for each line of the index:
+        #     sheet animation facing number x y width height
+        if sheet is not None:
+            for line in open(index,"r"):
+                values = line.split()
+                if len(values) == 8:
+                    rect = [int(value) for value in values[4:]]
+                    self.__frames[(values[0],values[1],values[2],int(values[3]))] = sheet.subsurface(rect)
+    
+    @classmethod
+    def get(cls,playerNum):
+        '''Returns the shared atlas of a player'''
+        path = "rez/atlas/player" + playerNum
+        sheet = None
+        if os.path.isfile(path + ".png") and os.path.isfile(path + ".idx"):
+            sheet = HellBoundAssets.image(path + ".png")
+            
+        # Rebuilds the atlas if the sheet has changed, eg. converted once the window opened
+        atlas = cls.__loaded.get(playerNum)
+        if atlas is None or atlas.__sheet is not sheet:
+            atlas = cls(playerNum,sheet,path + ".idx")
+            cls.__loaded[playerNum] = atlas
+        return atlas
+        
+    def frame(self,sheet,animation,facing,number):
+        '''Returns a frame, eg. frame("character","attack","left",3)'''
+        image = self.__frames.get((sheet,animation,facing,number))
+        
+        # Falls back to the frame's own file
+        if image is None:
+            if sheet == "character":
+                path = "rez/character" + self.__playerNum + "/" + animation + str(number) + ".png"
+            else:
+                path = "rez/projectile" + self.__playerNum + "/projectile" + str(number) + ".png"
+            image = HellBoundAssets.image(path,facing == "left")
+        return image
+        
+    def table(self,sheet,animation,frames,delay):
+        '''Returns the image to show on every frame of an animation, as a tuple
+        for each facing direction, eg. table("character","attack",32,4)[FACING["left"]][13]'''
+        key = (sheet,animation,frames,delay)
+        table = self.__tables.get(key)
+        if table is None:
+            table = (tuple(self.frame(sheet,animation,"left",count // delay) for count in range(frames)),
+                     tuple(self.frame(sheet,animation,"right",count // delay) for count in range(frames)))
+            self.__tables[key] = table
+        return table
+        
+class Entity(object):
+    '''This class is the base of the objects a match simulates: players,
+    healthbars and fireballs. Entities keep their attributes in slots
+    instead of a dictionary per instance, and are not sprites. A View
+    draws an entity in sprite groups, and is only made when asked for.'''
+    __slots__ = ("image","rect","__live","__view")
+    
+    def __init__(self):
+        '''The initializer starts the entity in play, with no view'''
+        self.image = None
+        self.rect = None
+        self.__live = True
+        self.__view = None
+        
+    def alive(self):
+        '''Tells us whether the entity is still in play'''
+        return self.__live
+        
+    def kill(self):
+        '''Takes the entity out of play, and its view out of every group'''
+        self.__live = False
+        if self.__view is not None:
+            self.__view.kill()
+            
+    def revive(self):
+        '''Puts the entity back in play, eg. when a match is rewound'''
+        self.__live = True
+        
+    def view(self):
+        '''Returns the sprite that draws the entity'''
+        if self.__view is None:
+            self.__view = self.makeView()
+        return self.__view
+        
+    def makeView(self):
+        '''Returns a new sprite to draw the entity with, a View by default'''
+        return View(self)
+        
+class View(pygame.sprite.Sprite):
+    '''This class defines the sprite that draws an entity. Its image and
+    rect are the entity's own.'''
+    def __init__(self,entity):
+        '''The initializer takes the entity to draw'''
+        pygame.sprite.Sprite.__init__(self)
+        self.entity = entity
+        
+    @property
+    def image(self):
+        '''The entity's image'''
+        return self.entity.image
+        
+    @property
+    def rect(self):
+        '''The entity's rect'''
+        return self.entity.rect
+        
+    @rect.setter
+    def rect(self,rect):
+        self.entity.rect = rect
+        
+class Player(Entity):
+    '''This class defines our player'''
+    __slots__ = ("__screen","__playerNum","__anims","__facing","__count","__changeX","__changeY",
+                 "__air","__state","__x","__y","__list","__level","__animation","__damage",
+                 "__defend","__dead","__sound")
+    
+    # Point of the rect that stays put when the image changes, used when drawing between frames
+    anchor = "midbottom"
+    
     def __init__(self,screen,playerNum,startX,startY,facing,level):
         '''The initializer takes a screen surface, starting x and y value, and facing direction.
         It loads animation images, sets the rect attributes, etc.'''
         # Initializes the super class
-        pygame.sprite.Sprite.__init__(self)
+        Entity.__init__(self)
         self.__screen = screen
-        self.__anims = {}
-        
         self.__playerNum = playerNum
         
-        # Loads images for the animations
-        self.animsLoad("sprint",1)
-        self.animsLoad("jump",8)
-        self.animsLoad("crouch",2)
-        self.animsLoad("defend",12)
-        self.animsLoad("attack",8)
-        self.animsLoad("dying",5)
-        self.animsLoad("idle",4)
-        
+        # Image tables of the animations, by animation index
+        self.__anims = self.animsLoad()
         
         # Initial Image  
-        self.image = self.__anims ["jumpright0"]
+        self.image = self.__anims[JUMP][FACING["right"]][0]
         
         # Gets image rect and sets the starting position
         self.getRect(self.image)
@@ -39,25 +174,22 @@ class Player(pygame.sprite.Sprite):
         self.__x = self.rect.centerx # The current x value
         self.__y = self.rect.bottom  # The current y value
         self.__list = []             # A list of collided objects
-        self.__level = level         # A list of blocks that the player can collide with
-        self.__animation = "jump"    # The animation currently being shown
+        self.__level = level         # The level whose platforms the player can collide with
+        self.__animation = JUMP      # The animation currently being shown
         self.__damage = False        # Allows player to do damage if True
         self.__defend = False        # Negates damage done by other players if True
         self.__dead = False          # States whether the player is dead
         self.__sound = False         # Tells whether sound should be played
         
-    def animsLoad(self,animation,num):
-        '''Takes an animation type, and range to load images'''
-        for image in range(num):
-            
-            # Adds image facing right to dictionary with key value (animation type + facing + number)
-            self.__anims [animation + "right" + str(image)] = pygame.image.load("rez/character" + self.__playerNum + "/" + animation + str(image) + ".png")
-            
-            # Flips image above and adds to dictionary
-            self.__anims [animation + "left" + str(image)] = pygame.transform.flip(self.__anims[str(animation) + "right" + str(image)], True, False)
+    def animsLoad(self):
+        '''Returns the image table of every animation, shared by every player
+        with the same atlas'''
+        atlas = Atlas.get(self.__playerNum)
+        return tuple(atlas.table("character",animation,frames,delay) for animation, frames, delay in ANIMATIONS)
         
-    def anim(self,animation,facing,count,delay):
-        '''Changes the image, resets the rect, and repositions the player'''
+    def anim(self,animation):
+        '''Changes the image to the next one of an animation index, resets the
+        rect, and repositions the player'''
         # Gets the current rect of the player
         self.holdRect(self.rect.centerx,self.rect.bottom)
         
@@ -65,8 +197,10 @@ class Player(pygame.sprite.Sprite):
         if self.__animation != animation:
             self.__count = 0
             
-        # Sets the requested image
-        self.image = self.__anims[str(animation) + str(facing) + str(int(self.counter(count,delay)))]
+        # Sets the image for the frame the animation is on
+        images = self.__anims[animation][FACING[self.__facing]]
+        self.counter(len(images))
+        self.image = images[self.__count]
         
         # Gets the new rect attributes
         self.getRect(self.image)
@@ -77,20 +211,13 @@ class Player(pygame.sprite.Sprite):
         # Sets value to current animation
         self.__animation = animation
         
-    def counter(self,number,delay):
+    def counter(self,number):
         '''Counter used in the anim method. number is the number of frames the animation lasts, not number of images'''
         # Resets the number if greater than # of images, else adds 1
         if self.__count >= number-1:
             self.__count = 0
         else:
             self.__count +=1
-            
-        # -1 is a sentinal value, which would go to the normal counter
-        # Else, divide by the delay, which changes image every delayth frame
-        if delay != -1:
-            return self.__count/delay
-        else:
-            return self.__count
         
     def gravity(self):
         '''Adds gravity to the player'''
@@ -183,6 +310,19 @@ class Player(pygame.sprite.Sprite):
         '''Allows the sound to be played'''
         return self.__sound
         
+    def getState(self):
+        '''Returns everything about the player that changes during a match, as a tuple'''
+        return (self.image,tuple(self.rect),self.__facing,self.__count,self.__changeX,self.__changeY,
+                self.__air,self.__state,self.__x,self.__y,self.__list,self.__animation,
+                self.__damage,self.__defend,self.__dead,self.__sound)
+        
+    def setState(self,state):
+        '''Returns the player to a state from getState()'''
+        (self.image,rect,self.__facing,self.__count,self.__changeX,self.__changeY,
+         self.__air,self.__state,self.__x,self.__y,self.__list,self.__animation,
+         self.__damage,self.__defend,self.__dead,self.__sound) = state
+        self.rect = pygame.Rect(rect)
+        
     def update(self):
         '''A method that will be called automatically to reposition the
         player sprite on the screen.'''
@@ -191,7 +331,7 @@ class Player(pygame.sprite.Sprite):
         self.gravity()
         
         # A list of platforms the player collides with
-        self.__list = pygame.sprite.spritecollide(self,self.__level,False)
+        self.__list = self.__level.collide(self.rect)
 
         # Stops gravity if player collides with platform and going down
         if self.__list and self.__changeY >= 0:
@@ -224,7 +364,7 @@ class Player(pygame.sprite.Sprite):
             # Stops animation from repeating
             if self.__count < 99:
                 # Dying animation, 100 frames, 20 frames per image
-                self.anim("dying",self.__facing,100,20)
+                self.anim(DYING)
             
         # If alive, determine animation
         if not self.__dead:
@@ -237,7 +377,7 @@ class Player(pygame.sprite.Sprite):
                 if self.__air == False:
                     
                     # Attack animation, total of 32 frames, 4 frames per image
-                    self.anim("attack",self.__facing,32,4)
+                    self.anim(ATTACK)
                     self.stop("x")
                         
                     # Moves player forward if after 3rd image
@@ -274,7 +414,7 @@ class Player(pygame.sprite.Sprite):
                     # Blocks damage
                     self.__defend = True
                     # Defend animation, 12 frames, no delay
-                    self.anim("defend",self.__facing,12,-1)
+                    self.anim(DEFEND)
                     self.stop("x")
                     if self.__count%2 == 0:
                         self.__sound = True
@@ -294,7 +434,7 @@ class Player(pygame.sprite.Sprite):
                 # If player is on the ground and not moving
                 if self.__air == False and self.__changeX == 0:
                     # Crouch animation, 60 frames, 30 frames per image
-                    self.anim("crouch",self.__facing,60,30)
+                    self.anim(CROUCH)
                     
                 # Otherwise, sets state to movement
                 else:
@@ -309,28 +449,39 @@ class Player(pygame.sprite.Sprite):
                 # If the player is on the ground and not moving
                 if self.__air == False and self.__changeX == 0:
                     # Idle animation, 120 frames, 30 frames per image
-                    self.anim("idle",self.__facing,120,30)
+                    self.anim(IDLE)
                     
                 # If the player is on the ground and moving
                 if self.__air == False and self.__changeX != 0:
                     # Sprint animation, 1 frame, no delay
-                    self.anim("sprint",self.__facing,1,-1)
+                    self.anim(SPRINT)
                     
                 # If the player is in the air
                 if self.__air == True:
                     # Jump animation, 8 frames, no delay
-                    self.anim("jump",self.__facing,8,-1)
+                    self.anim(JUMP)
                     
 class Platform(pygame.sprite.Sprite):
     '''This class defines the sprite for platforms'''
-    def __init__(self,left,top):
-        '''This initializer takes the screen, left, and top positions for the platform sprites'''
+    def __init__(self,left,top,length=1):
+        '''This initializer takes the left and top positions for the platform sprite,
+        and the number of grid cells the platform spans'''
         
         # Initializes the super class
         pygame.sprite.Sprite.__init__(self)
 
         # Sets image
-        self.image = pygame.image.load("rez/surface.png")
+        self.image = HellBoundAssets.image("rez/surface.png")
+        
+        # Repeats the image for platforms wider than one cell. BLEND_RGBA_MAX
+        # onto an empty surface copies the pixels exactly, instead of blending them.
+        if length > 1:
+            tile = self.image
+            self.image = pygame.Surface((tile.get_width() * length,tile.get_height()),pygame.SRCALPHA,32)
+            self.image.fill((0,0,0,0))
+            for cell in range(length):
+                self.image.blit(tile,(cell * tile.get_width(),0),special_flags=pygame.BLEND_RGBA_MAX)
+            self.image = HellBoundAssets.displayFormat(self.image)
         
         # Sets rect
         self.rect = self.image.get_rect()
@@ -339,42 +490,48 @@ class Platform(pygame.sprite.Sprite):
         self.rect.top = top
         self.rect.left = left
         
-class HealthBar(pygame.sprite.Sprite):
-    '''This class defines the sprite for healthbars'''
-    def __init__(self,screen,x,y,align):
-        '''The initializer takes the screen, x,y, and alignment'''
+class HealthBar(Entity):
+    '''This class defines healthbars. The HUD draws them, so a healthbar
+    itself has no image.'''
+    __slots__ = ("__health","__align","__x","__y","__color","__dead")
+    
+    def __init__(self,screen,x,y,align,color=(255,0,0)):
+        '''The initializer takes the screen, x,y, alignment and colour'''
         
         # Initiate the super class
-        pygame.sprite.Sprite.__init__(self)
+        Entity.__init__(self)
         
         # Beginning health of 200
         self.__health = 200
         
-        # Sets the image
-        self.image = pygame.Surface((self.__health,10)).convert()
-        self.image.fill((255,0,0))
-        
-        # Sets the rect
-        self.rect = self.image.get_rect()
-        self.rect.top = y
-        
         # Stats
         self.__align = align # Side to align the sprite
         self.__x = x         # x value
         self.__y = y         # y value
+        self.__color = color # Colour of the bar
         self.__dead = False  # Sets to True when player dies
         
-        # Aligns the sprite left or right
-        if self.__align == "right":
-            self.rect.right = self.__x
-        if self.__align == "left":
-            self.rect.left = self.__x
+    def makeView(self):
+        '''Returns the HUD bar that draws the health left'''
+        return HellBoundHUD.Bar(self.health,self.__x,self.__y,self.__align,color=self.__color)
         
     def loseHealth(self,damage):
         '''Takes away health'''
         # Subtracts damage from health
         self.__health -= damage
         
+    def health(self):
+        '''Returns the health left, never below 0'''
+        return max(self.__health,0)
+        
+    def getState(self):
+        '''Returns everything about the healthbar that changes during a match, as a tuple'''
+        return (self.__health,self.__dead)
+        
+    def setState(self,state):
+        '''Returns the healthbar to a state from getState()'''
+        self.__health, self.__dead = state
+        
     def dead(self):
         '''Tells us if player is dead or alive'''
         if self.__dead:
@@ -383,35 +540,35 @@ class HealthBar(pygame.sprite.Sprite):
             return False
         
     def update(self):
-        '''A method that will be called automatically to set the health of the player'''
-        # Reduces the healthbar if still alive
-        if self.__health >= 1:
-            self.image = pygame.Surface((self.__health,10)).convert()
-            self.image.fill((255,0,0))
-            self.rect = self.image.get_rect()
-        
-            if self.__align == "right":
-                self.rect.right = self.__x
-            if self.__align == "left":
-                self.rect.left = self.__x
-            self.rect.top = self.__y
-            
-        # Otherwise, kills the sprite and tells player that it is dead
-        else:
+        '''A method that will be called automatically to check the health of the player'''
+        # Kills the sprite and tells player that it is dead once the health runs out
+        if self.__health < 1:
             self.__dead = True
             self.__health = 0
             self.kill()
         
-class Projectile(pygame.sprite.Sprite):
-    '''This class defines the sprite for fireballs'''
+class Projectile(Entity):
+    '''This class defines fireballs. A fireball can be fired again once it
+    is out of play, by resetting it instead of making a new one.'''
+    __slots__ = ("__screen","__x","__y","__direction","__num","__count","__accelerate","__projAnims","__resetX","__tables")
+    
     def __init__(self,screen,playerData):
         '''This initializer takes the screen, and a list of playerdata as attributes'''
         # Initializes the super class
-        pygame.sprite.Sprite.__init__(self)
+        Entity.__init__(self)
+        self.__screen = screen
+        
+        # Gets the shared image tables of the fireball once, one per direction
+        self.__tables = Atlas.get(playerData[3]).table("projectile",*FIREBALL)
+        self.reset(playerData)
+        
+    def reset(self,playerData):
+        '''Puts the fireball back in play, flying from a player. Takes the same
+        list of playerdata as the initializer, from the same player.'''
+        self.revive()
         
         # Player data is a list of values from the player sprite It contains:
         #     [self.rect.right,self.rect.centery,self.__facing,self.__playerNum]
-        self.__screen = screen
         self.__x = playerData[0]
         self.__y = playerData[1]
         self.__direction = playerData[2]
@@ -421,14 +578,11 @@ class Projectile(pygame.sprite.Sprite):
         # The speed that the sprite accelerates by per frame
         self.__accelerate = 0.35
         
-        # Loads images of the player facing left and right, and adds to a dictionary
-        self.__projAnims = {}
-        for image in range(6):
-            self.__projAnims ["projright" + str(image)] = pygame.image.load("rez/projectile" + self.__num + "/projectile" + str(image) + ".png")
-            self.__projAnims ["projleft" + str(image)] = pygame.transform.flip(self.__projAnims["projright" + str(image)],True,False)
+        # Uses the image table of the direction it flies
+        self.__projAnims = self.__tables[FACING[self.__direction]]
         
         # Sets the initial image and rect values
-        self.image = self.__projAnims["proj" + self.__direction + str(self.__count)]
+        self.image = self.__projAnims[self.__count]
         self.rect = self.image.get_rect()
         self.rect.x = self.__x
         self.rect.centery = self.__y
@@ -439,6 +593,18 @@ class Projectile(pygame.sprite.Sprite):
         if self.__direction == "right":
             self.__resetX = self.rect.right
             
+    def getState(self):
+        '''Returns everything about the fireball that changes as it flies or
+        is fired again, as a tuple'''
+        return (self.image,tuple(self.rect),self.__accelerate,self.__resetX,self.__count,
+                self.__y,self.__direction,self.__num,self.__projAnims)
+        
+    def setState(self,state):
+        '''Returns the fireball to a state from getState()'''
+        (self.image,rect,self.__accelerate,self.__resetX,self.__count,
+         self.__y,self.__direction,self.__num,self.__projAnims) = state
+        self.rect = pygame.Rect(rect)
+        
     def update(self):
         '''A method that will be called automatically to reposition the
         fireball sprite on the screen.'''
@@ -458,7 +624,7 @@ class Projectile(pygame.sprite.Sprite):
             self.__count = 30
             
         # Changes the image of the fireball
-        self.image = self.__projAnims ["proj" + self.__direction + str(int(self.__count / 10))]
+        self.image = self.__projAnims[self.__count]
         
         self.rect = self.image.get_rect()
             
@@ -479,26 +645,62 @@ class Projectile(pygame.sprite.Sprite):
             
 class Label(pygame.sprite.Sprite):
     '''This class defines the sprite for text in-game'''
-    def __init__(self,x,y,size,message,align):
-        '''This initializer takes the x,y,text size, message, and alignment'''
+    def __init__(self,x,y,size,message,align,color=(255,255,255)):
+        '''This initializer takes the x,y,text size, message, alignment and colour'''
         # Initializes the super class
         pygame.sprite.Sprite.__init__(self)
         
-        # Sets the font and values
-        self.__font = pygame.font.Font("rez/ARCADECLASSIC.ttf", size)
+        # Sets the values
+        self.__x = x
+        self.__y = y
+        self.__size = size
+        self.__align = align
+        self.__color = color
+        self.__message = message
     
-        # Sets the image attributes
-        self.image = self.__font.render(message, 1, (255, 255, 255))
+        # Sets the image attributes, shared with every label showing the same text
+        self.image = HellBoundAssets.text("rez/ARCADECLASSIC.TTF",size,message,color)
+        self.place()
+        
+    def setText(self,message):
+        '''Changes the text, eg. of a timer or a score. The new image is put
+        together from cached runs of text, so nothing is rendered again.'''
+        if message == self.__message:
+            return
+        self.__message = message
+        self.image = HellBoundAssets.compose("rez/ARCADECLASSIC.TTF",self.__size,message,self.__color)
+        self.place()
+        
+    def place(self):
+        '''Sets the rect to the image, and aligns the text'''
         self.rect = self.image.get_rect()
+        if self.__align == "center":
+            self.rect.centerx = self.__x
+        if self.__align == "left":
+            self.rect.left = self.__x
+        if self.__align == "right":
+            self.rect.right = self.__x
+        self.rect.top = self.__y
         
-        # Aligns the text
-        if align == "center":
-            self.rect.centerx = x
-        if align == "left":
-            self.rect.left = x
-        if align == "right":
-            self.rect.right = x
-        self.rect.top = y
+class Marker(pygame.sprite.Sprite):
+    '''This class defines the number floating above a player, in the colour
+    of their healthbar, as players only look like player 1 or player 2'''
+    anchor = "midbottom"
+    
+    def __init__(self,player,number,color):
+        '''This initializer takes the player followed, their number and colour'''
+        # Initializes the super class
+        pygame.sprite.Sprite.__init__(self)
+        self.__player = player
+        
+        # Sets the image, shared with every marker of the same number and colour
+        self.image = HellBoundAssets.text("rez/ARCADECLASSIC.TTF",20,str(number),color)
+        self.rect = self.image.get_rect()
+        self.update()
+        
+    def update(self):
+        '''Moves the marker to just above the player'''
+        self.rect.midbottom = (self.__player.rect.centerx,self.__player.rect.top - 2)
         
 class Point(pygame.sprite.Sprite):
     '''This class defines the sprite for the mouse pointer'''
@@ -509,7 +711,7 @@ class Point(pygame.sprite.Sprite):
         pygame.sprite.Sprite.__init__(self)
         
         # Loads the mouse image, sets image and rect values
-        self.__point = pygame.image.load("rez/pointer.gif")
+        self.__point = HellBoundAssets.image("rez/pointer.gif")
         self.image = self.__point
         self.rect = self.image.get_rect()
         
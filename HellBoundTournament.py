@@ -0,0 +1,131 @@
+""" Author: Anson Tran
+
+    Description: Plays many headless HellBound matches between bots, spread
+                 over every core with a process pool. Each result is written
+                 to a JSON lines file as soon as it arrives, and only running
+                 totals are kept in memory. At the end, win rates, match
+                 lengths and damage are printed for every pairing and level.
+
+                 Example:
+                     python HellBoundTournament.py --matches 1000 --bots rusher turtle zoner
+"""
+
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+
+import sys, json, random, argparse, multiprocessing, HellBoundSim, HellBoundLevel, HellBoundBots
+
+# Levels already loaded by this process, by path
+levels = {}
+
+def playMatch(job):
+    '''Plays one match and returns its result. job is a tuple of
+    (match number, level path, bot 1 name, bot 2 name, seed, frame limit).'''
+    number, level, name1, name2, seed, limit = job
+
+    # Levels never change during a match, so each process loads them once
+    if level not in levels:
+        levels[level] = HellBoundLevel.Level(level)
+
+    rng = random.Random(seed)
+    match = HellBoundSim.Match(levels[level])
+    bot1 = HellBoundBots.BOTS[name1](rng)
+    bot2 = HellBoundBots.BOTS[name2](rng)
+    sounds = {"cut": 0, "block": 0, "fireball": 0}
+
+    while not match.over() and match.frame() < limit:
+        bits1 = bot1.act(match,match.player1,match.player2)
+        bits2 = bot2.act(match,match.player2,match.player1)
+        for sound in match.step(bits1,bits2):
+            sounds[sound] += 1
+
+    return {"match": number, "level": level, "bot1": name1, "bot2": name2, "seed": seed,
+            "winner": match.winner(), "frames": match.frame(), "finished": match.over(),
+            "damage1": 200 - match.health2.health(), "damage2": 200 - match.health1.health(),
+            "fireballs": sounds["fireball"], "cuts": sounds["cut"], "blocks": sounds["block"]}
+
+def jobs(matches,levelPaths,bots,seed,limit):
+    '''Yields the matches to play, cycling through every pairing and level'''
+    pairings = [(bot1,bot2) for bot1 in bots for bot2 in bots]
+    for number in range(matches):
+        bot1, bot2 = pairings[number % len(pairings)]
+        level = levelPaths[(number // len(pairings)) % len(levelPaths)]
+        yield (number,level,bot1,bot2,seed + number,limit)
+
+class Totals(object):
+    '''This class keeps running totals for one pairing on one level'''
+    def __init__(self):
+        self.matches = 0
+        self.wins1 = 0
+        self.wins2 = 0
+        self.draws = 0
+        self.unfinished = 0
+        self.frames = 0
+        self.damage1 = 0
+        self.damage2 = 0
+
+    def add(self,result):
+        '''Adds a match result to the totals'''
+        self.matches += 1
+        self.frames += result["frames"]
+        self.damage1 += result["damage1"]
+        self.damage2 += result["damage2"]
+        if not result["finished"]:
+            self.unfinished += 1
+        elif result["winner"] == 1:
+            self.wins1 += 1
+        elif result["winner"] == 2:
+            self.wins2 += 1
+        else:
+            self.draws += 1
+
+    def summary(self):
+        '''Returns the totals as averages and rates'''
+        return {"matches": self.matches,
+                "winRate1": round(self.wins1 / float(self.matches),3),
+                "winRate2": round(self.wins2 / float(self.matches),3),
+                "drawRate": round(self.draws / float(self.matches),3),
+                "unfinished": self.unfinished,
+                "averageFrames": round(self.frames / float(self.matches),1),
+                "averageDamage1": round(self.damage1 / float(self.matches),1),
+                "averageDamage2": round(self.damage2 / float(self.matches),1)}
+
+def main(arguments=None):
+    '''Runs a tournament from the command line'''
+    parser = argparse.ArgumentParser(description="Play headless HellBound matches between bots.")
+    parser.add_argument("--matches",type=int,default=100,help="number of matches to play")
+    parser.add_argument("--levels",nargs="+",default=["level.txt"],help="level files to play on")
+    parser.add_argument("--bots",nargs="+",default=["rusher","turtle","zoner","random"],choices=sorted(HellBoundBots.BOTS),help="bots to enter")
+    parser.add_argument("--workers",type=int,default=multiprocessing.cpu_count(),help="processes to use")
+    parser.add_argument("--seed",type=int,default=0,help="seed of the first match")
+    parser.add_argument("--limit",type=int,default=60 * 60 * 3,help="frames before a match is abandoned")
+    parser.add_argument("--out",default="tournament.jsonl",help="file the match results are streamed to")
+    options = parser.parse_args(arguments)
+
+    totals = {}
+    output = open(options.out,"w")
+    pool = multiprocessing.Pool(options.workers)
+    try:
+        # Results are written as they finish, in any order
+        work = jobs(options.matches,options.levels,options.bots,options.seed,options.limit)
+        for result in pool.imap_unordered(playMatch,work,chunksize=4):
+            output.write(json.dumps(result) + "\n")
+            key = (result["level"],result["bot1"],result["bot2"])
+            if key not in totals:
+                totals[key] = Totals()
+            totals[key].add(result)
+    finally:
+        pool.close()
+        pool.join()
+        output.close()
+
+    summary = []
+    for (level, bot1, bot2) in sorted(totals):
+        line = {"level": level, "bot1": bot1, "bot2": bot2}
+        line.update(totals[(level,bot1,bot2)].summary())
+        summary.append(line)
+        print(json.dumps(line))
+    return summary
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,25 @@
+""" Author: Anson Tran
+
+    Description: Runs HellBound from its folder, eg. "python HellBound" from
+                 the folder above it, with the same options as HellBound.py.
+                 The game's files are found relative to this folder, while
+                 paths given as options are relative to where it was run.
+"""
+
+import os, sys
+
+# Options taking a path, which are made absolute before leaving the folder they are relative to
+PATHS = ("--level","--record","--replay","--trace")
+
+arguments = sys.argv[1:]
+for index in range(len(arguments) - 1):
+    if arguments[index] in PATHS:
+        arguments[index + 1] = os.path.abspath(arguments[index + 1])
+
+folder = os.path.dirname(os.path.abspath(__file__))
+os.chdir(folder)
+if folder not in sys.path:
+    sys.path.insert(0,folder)
+
+import HellBound
+HellBound.main(arguments)